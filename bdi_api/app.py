@@ -1,21 +1,33 @@
+import asyncio
 import logging
+import os
+from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from typing import AsyncIterator
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from neo4j.exceptions import ServiceUnavailable
 from starlette import status
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 
 import bdi_api
+from bdi_api import profiling
+from bdi_api.db import query_stats
 from bdi_api.examples import v0_router
+from bdi_api.metrics import MetricsMiddleware, registry
+from bdi_api.recorder import RequestRecorder
 from bdi_api.s1.exercise import s1
 from bdi_api.s4.exercise import s4
 from bdi_api.s5.exercise import s5
+from bdi_api.s6 import jobs, mongo
 from bdi_api.s6.exercise import s6
+from bdi_api.s7 import graph
 from bdi_api.s7.exercise import s7
 from bdi_api.s8.exercise import s8
 from bdi_api.s9.exercise import s9
+from bdi_api.settings import Settings
+
+settings = Settings()
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -24,7 +36,21 @@ logger = logging.getLogger("uvicorn.error")
 async def lifespan(app: FastAPI) -> AsyncIterator:
     logger.setLevel(logging.INFO)
     logger.info("Application started. You can check the documentation in http://localhost:8080/docs/")
+    mongo.open_client()
+    # In the background: an unreachable MongoDB must not delay startup of the other routers
+    s6_indexes = asyncio.create_task(mongo.ensure_indexes())
+    graph.open_driver()
+    # The driver is synchronous: the constraint is created in a thread, also in the background
+    s7_constraints = None
+    if settings.s7_graph_backend == "neo4j":
+        s7_constraints = asyncio.create_task(asyncio.to_thread(graph.ensure_constraints))
     yield
+    if s7_constraints is not None:
+        s7_constraints.cancel()
+    graph.close_driver()
+    s6_indexes.cancel()
+    await jobs.cancel_all()
+    await mongo.close_client()
     logger.warning("Application shutdown")
 
 
@@ -49,6 +75,7 @@ app = FastAPI(
     title="bdi-api",
     version=bdi_api.__version__,
     description=description,
+    lifespan=lifespan,
 )
 
 app.include_router(v0_router)
@@ -60,6 +87,23 @@ app.include_router(s7)
 app.include_router(s8)
 app.include_router(s9)
 
+if settings.profiling_enabled:
+    app.add_middleware(profiling.ProfilingMiddleware, interval_ms=settings.profiling_interval_ms)
+    app.include_router(profiling.router)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+if settings.record_requests:
+    os.makedirs(os.path.dirname(settings.record_path) or ".", exist_ok=True)
+    app.add_middleware(RequestRecorder, path=settings.record_path, max_body_bytes=settings.record_max_body_bytes)
+
+
+@app.exception_handler(ServiceUnavailable)
+async def neo4j_unavailable(request: Request, exc: ServiceUnavailable) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": f"Neo4J is unavailable: {exc}"},
+    )
+
 
 @app.get("/health", status_code=200)
 async def get_health() -> JSONResponse:
@@ -74,6 +118,18 @@ async def get_version() -> dict:
     return {"version": bdi_api.__version__}
 
 
+@app.get("/db/query-stats", status_code=200)
+async def get_query_stats() -> dict:
+    """SQL statements run per route by the s5 and s8 endpoints, to spot N+1 patterns."""
+    return query_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """Request and storage metrics in the Prometheus text format, for scraping."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 def main() -> None:
     uvicorn.run(app, host="0.0.0.0", port=8080, proxy_headers=True, access_log=False)
 
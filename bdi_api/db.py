@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fastapi import Request
+from sqlalchemy import Engine, create_engine, event
+
+from bdi_api.metrics import observe_storage
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+logger = logging.getLogger("uvicorn.error")
+
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+
+
+@dataclass
+class RouteQueryStats:
+    requests: int = 0
+    queries: int = 0
+    slow_queries: int = 0
+    total_ms: float = 0.0
+    max_queries_per_request: int = 0
+
+
+@dataclass
+class _RequestQueries:
+    route: str
+    queries: int = 0
+
+
+_current_request: ContextVar[_RequestQueries | None] = ContextVar("current_request", default=None)
+_stats: dict[str, RouteQueryStats] = {}
+_stats_lock = threading.Lock()
+
+
+async def track_queries(request: Request) -> AsyncIterator[None]:
+    """Router dependency tagging every statement run by the request with its route.
+
+    It is async on purpose: the context variable must be set in the request task
+    so that sync endpoints, which run on a copy of that context, see it.
+    """
+    route = request.scope.get("route")
+    current = _RequestQueries(route=getattr(route, "path", request.url.path))
+    token = _current_request.set(current)
+    try:
+        yield
+    finally:
+        _current_request.reset(token)
+        with _stats_lock:
+            stats = _stats.setdefault(current.route, RouteQueryStats())
+            stats.requests += 1
+            stats.max_queries_per_request = max(stats.max_queries_per_request, current.queries)
+
+
+def query_stats() -> dict[str, dict]:
+    """Per-route statement counters. A high `queries_per_request` usually means N+1."""
+    with _stats_lock:
+        return {
+            route: {
+                "requests": s.requests,
+                "queries": s.queries,
+                "queries_per_request": round(s.queries / s.requests, 2) if s.requests else None,
+                "max_queries_per_request": s.max_queries_per_request,
+                "slow_queries": s.slow_queries,
+                "total_ms": round(s.total_ms, 3),
+            }
+            for route, s in sorted(_stats.items())
+        }
+
+
+def reset_query_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def _explain(conn, statement: str, parameters) -> list[str]:
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return []
+    # A raw DB-API cursor, so the EXPLAIN itself does not go through the hooks. It runs in a
+    # savepoint: on PostgreSQL a failing statement would abort the transaction of the caller
+    savepoint = conn.in_transaction()
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT bdi_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+        except Exception as e:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT bdi_explain")
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT bdi_explain")
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    # Labelled by statement kind (SELECT, INSERT, ...): full statements would make too many series
+    observe_storage("sql", statement.split(None, 1)[0].upper() if statement.strip() else "-", elapsed_ms / 1000)
+    current = _current_request.get()
+    route = current.route if current else "-"
+    slow = elapsed_ms >= settings.slow_query_ms
+    if current:
+        current.queries += 1
+    with _stats_lock:
+        stats = _stats.setdefault(route, RouteQueryStats())
+        stats.queries += 1
+        stats.total_ms += elapsed_ms
+        stats.slow_queries += slow
+    if slow:
+        plan = _explain(conn, statement, parameters) if settings.explain_slow_queries and not executemany else []
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s%s",
+            elapsed_ms,
+            route,
+            " ".join(statement.split()),
+            "".join(f"\n    {line}" for line in plan),
+        )
+
+
+@lru_cache
+def get_engine(db_url: str | None = None) -> Engine:
+    """Return the process-wide SQLAlchemy engine for `BDI_DB_URL`.
+
+    Creating an engine per request throws away its connection pool,
+    so every router shares this one. Every statement is timed and
+    counted per route (see `track_queries`).
+    """
+    engine = create_engine(db_url or settings.db_url)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
@@ -1,5 +1,3 @@
-from typing import Union
-
 from fastapi import APIRouter, status
 
 v0_router = APIRouter(
@@ -18,5 +16,5 @@ def hello_world() -> dict:
 
 
 @v0_router.get("/items/{item_id}")
-def read_item(item_id: int, q: Union[str, None] = None) -> dict:
+def read_item(item_id: int, q: str | None = None) -> dict:
     return {"item_id": item_id, "q": q}
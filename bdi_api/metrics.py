@@ -0,0 +1,212 @@
+"""Per-route request metrics and storage timings, exposed in the Prometheus text format.
+
+`MetricsMiddleware` counts requests by route template (`/api/s1/aircraft/{icao}/positions`,
+not the concrete path, so the number of series stays bounded), tracks the requests in
+flight and keeps latency and response size histograms. Storage layers report their own
+operations with `timed` / `observe_storage`. Both are served by `GET /metrics`.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from botocore.client import BaseClient
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Label of the requests that match no route, instead of one series per unknown path
+UNMATCHED = "unmatched"
+
+_Labels = tuple[str, ...]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[_Labels, float]] = {}
+        self._gauges: dict[str, dict[_Labels, float]] = {}
+        self._histograms: dict[str, dict[_Labels, Histogram]] = {}
+        # name -> (type, help, label names)
+        self._meta: dict[str, tuple[str, str, _Labels]] = {}
+
+    def describe(self, kind: str, name: str, help: str, labels: _Labels) -> None:
+        self._meta[name] = (kind, help, labels)
+
+    def inc(self, name: str, labels: _Labels, value: float = 1.0) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def add(self, name: str, labels: _Labels, value: float) -> None:
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def observe(self, name: str, labels: _Labels, value: float, buckets: tuple[float, ...]) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Every series in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, (kind, help, label_names) in sorted(self._meta.items()):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                if kind == "histogram":
+                    for labels, histogram in sorted(self._histograms.get(name, {}).items()):
+                        lines += _histogram_lines(name, label_names, labels, histogram)
+                else:
+                    values = self._counters if kind == "counter" else self._gauges
+                    for labels, value in sorted(values.get(name, {}).items()):
+                        lines.append(f"{name}{_format_labels(label_names, labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(names: _Labels, values: _Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, label_names: _Labels, labels: _Labels, histogram: Histogram) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts, strict=True):
+        cumulative += count
+        le = bound if isinstance(bound, str) else f"{bound:g}"
+        bucket_labels = _format_labels(label_names, labels, 'le="' + le + '"')
+        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(label_names, labels)} {histogram.sum:g}")
+    lines.append(f"{name}_count{_format_labels(label_names, labels)} {cumulative}")
+    return lines
+
+
+registry = Registry()
+registry.describe("counter", "bdi_http_requests_total", "HTTP requests answered.", ("method", "route", "status"))
+registry.describe("gauge", "bdi_http_requests_in_flight", "HTTP requests being served.", ("method",))
+registry.describe("histogram", "bdi_http_request_duration_seconds", "Time to answer a request.", ("method", "route"))
+registry.describe("histogram", "bdi_http_response_size_bytes", "Size of the response bodies.", ("method", "route"))
+registry.describe(
+    "histogram",
+    "bdi_storage_operation_duration_seconds",
+    "Time spent in storage calls (DuckDB, S3, SQL, MongoDB, Neo4J).",
+    ("system", "operation"),
+)
+registry.describe("counter", "bdi_storage_errors_total", "Storage calls that raised.", ("system", "operation"))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def measuring_send(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        registry.add("bdi_http_requests_in_flight", (method,), 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, measuring_send)
+        finally:
+            seconds = time.perf_counter() - start
+            registry.add("bdi_http_requests_in_flight", (method,), -1)
+            route = getattr(scope.get("route"), "path", UNMATCHED)
+            registry.inc("bdi_http_requests_total", (method, route, str(status)))
+            registry.observe("bdi_http_request_duration_seconds", (method, route), seconds, LATENCY_BUCKETS)
+            registry.observe("bdi_http_response_size_bytes", (method, route), size, SIZE_BUCKETS)
+
+
+def observe_storage(system: str, operation: str, seconds: float, error: bool = False) -> None:
+    """Report one storage call, e.g. `observe_storage("s3", "PutObject", 0.12)`."""
+    registry.observe("bdi_storage_operation_duration_seconds", (system, operation), seconds, LATENCY_BUCKETS)
+    if error:
+        registry.inc("bdi_storage_errors_total", (system, operation))
+
+
+@contextmanager
+def timed(system: str, operation: str) -> Iterator[None]:
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe_storage(system, operation, time.perf_counter() - start, error)
+
+
+def instrument_boto3(client: BaseClient) -> BaseClient:
+    """Time every API call of a boto3 client, labelled with its operation (`GetObject`, ...)."""
+
+    def before(context: dict, model, **kwargs) -> None:
+        context["metrics_call"] = model.name, time.perf_counter()
+
+    def after(context: dict, http_response=None, exception=None, **kwargs) -> None:
+        call = context.pop("metrics_call", None)
+        if call is not None:
+            operation, start = call
+            error = exception is not None or http_response is None or http_response.status_code >= 400
+            observe_storage(client.meta.service_model.service_name, operation, time.perf_counter() - start, error)
+
+    client.meta.events.register("before-call", before)
+    client.meta.events.register("after-call", after)
+    # Connection errors and timeouts never reach after-call
+    client.meta.events.register("after-call-error", after)
+    return client
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo listener reporting the duration of every command (`find`, `insert`, ...)."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        observe_storage("mongodb", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        observe_storage("mongodb", event.command_name, event.duration_micros / 1e6, error=True)
@@ -0,0 +1,178 @@
+"""Opt-in sampling profiler for single requests.
+
+With BDI_PROFILING_ENABLED=true, a request sent with the `X-Profile: 1` header or the
+`profile=1` query parameter is profiled. While it is served, a thread samples the
+stacks of every thread every BDI_PROFILING_INTERVAL_MS, and only the stacks going
+through the request's endpoint are kept. So it works whether the endpoint runs on the
+event loop or in the threadpool (sync endpoints), which cProfile cannot follow.
+Concurrent requests to the same endpoint show up in the same profile.
+
+The response carries an `X-Profile-Id` header and a `Link` to `GET /profiles/{id}`.
+That endpoint returns a summary of the hottest functions, and `?format=folded` returns
+the collapsed stacks for flamegraph.pl or https://www.speedscope.app. Both files are
+stored under BDI_LOCAL_DIR/profiles.
+"""
+
+import inspect
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from os.path import join
+from types import CodeType, FrameType
+from typing import Annotated, Literal
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.params import Path, Query
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+PROFILE_ID = r"^[0-9a-f]{32}$"
+TOP_FUNCTIONS = 30
+
+
+class Sampler(threading.Thread):
+    """Records the stack of every other thread, as tuples of code objects from root to leaf."""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(daemon=True, name="profiling-sampler")
+        self.interval = interval
+        self.stacks: list[tuple[CodeType, ...]] = []
+        # A tick waits for the GIL, so there are fewer of them than `seconds / interval`
+        self.ticks = 0
+        self._stop_event = threading.Event()
+        self.started_at = 0.0
+        self.seconds = 0.0
+
+    def run(self) -> None:
+        self.started_at = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            self.ticks += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.ident:
+                    self.stacks.append(_stack(frame))
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self.seconds = time.perf_counter() - self.started_at
+
+
+def _stack(frame: FrameType | None) -> tuple[CodeType, ...]:
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(reversed(codes))
+
+
+def _label(code: CodeType) -> str:
+    filename = code.co_filename
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1 :]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def endpoint_stacks(stacks: list[tuple[CodeType, ...]], endpoint: CodeType | None) -> list[tuple[CodeType, ...]]:
+    """The stacks going through `endpoint`, starting at its frame. All of them without an endpoint."""
+    if endpoint is None:
+        return stacks
+    return [stack[stack.index(endpoint) :] for stack in stacks if endpoint in stack]
+
+
+def summarize(stacks: list[tuple[CodeType, ...]], sampler: Sampler, title: str) -> str:
+    """Hottest functions by own samples and by samples including their callees."""
+    own = Counter(stack[-1] for stack in stacks)
+    total = Counter(code for stack in stacks for code in set(stack))
+    lines = [
+        title,
+        f"{len(stacks)} samples in the endpoint out of {sampler.ticks} ticks over {sampler.seconds * 1000:.1f} ms",
+        "",
+        f"{'own %':>7} {'total %':>8}  function",
+    ]
+    for code, count in own.most_common(TOP_FUNCTIONS):
+        lines.append(f"{100 * count / len(stacks):>7.1f} {100 * total[code] / len(stacks):>8.1f}  {_label(code)}")
+    return "\n".join(lines) + "\n"
+
+
+def folded(stacks: list[tuple[CodeType, ...]]) -> str:
+    """Collapsed stacks: `root;caller;leaf count` per line."""
+    counts = Counter(";".join(_label(code) for code in stack) for stack in stacks)
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def profile_path(profile_id: str, extension: str) -> str:
+    return join(settings.profiles_dir, f"{profile_id}.{extension}")
+
+
+def _requested(scope: Scope) -> bool:
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+        return True
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    return query.get("profile", [""])[-1].lower() in ("1", "true")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, interval_ms: float = 1.0) -> None:
+        self.app = app
+        self.interval = interval_ms / 1000
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_link(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Profile-Id"] = profile_id
+                headers.append("Link", f'</profiles/{profile_id}>; rel="profile"')
+            await send(message)
+
+        sampler = Sampler(self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_link)
+        finally:
+            # Streaming bodies are sent by the call above, so they are included
+            sampler.stop()
+            endpoint = scope.get("endpoint")
+            code = getattr(inspect.unwrap(endpoint), "__code__", None) if endpoint else None
+            stacks = endpoint_stacks(sampler.stacks, code)
+            title = f"{scope['method']} {scope['path']}"
+            os.makedirs(settings.profiles_dir, exist_ok=True)
+            with open(profile_path(profile_id, "txt"), "w") as f:
+                f.write(summarize(stacks, sampler, title))
+            with open(profile_path(profile_id, "folded"), "w") as f:
+                f.write(folded(stacks))
+
+
+router = APIRouter(include_in_schema=False)
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(
+    profile_id: Annotated[str, Path(pattern=PROFILE_ID)],
+    format: Annotated[
+        Literal["summary", "folded"],
+        Query(description="`folded` for the collapsed stacks of flame graph tools"),
+    ] = "summary",
+) -> PlainTextResponse:
+    """The profile of a request sent with `X-Profile: 1`."""
+    try:
+        with open(profile_path(profile_id, "txt" if format == "summary" else "folded")) as f:
+            return PlainTextResponse(f.read())
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile '{profile_id}' not found") from e
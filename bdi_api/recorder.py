@@ -0,0 +1,89 @@
+"""ASGI middleware appending every request to a JSONL file, to replay traffic shapes later.
+
+Enable it with BDI_RECORD_REQUESTS=true. Each line holds the request (`method`, `path`,
+`query`, `body`) with its route template, arrival time, status, duration and response
+size. Replay a recording with `python -m benchmarks.replay`.
+"""
+
+import base64
+import json
+import threading
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class RequestRecorder:
+    def __init__(self, app: ASGIApp, path: str, max_body_bytes: int = 65536) -> None:
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self._lock = threading.Lock()
+        # Line-buffered: every record reaches the file even if the server is killed
+        self._file = open(path, "a", buffering=1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        body = bytearray()
+        truncated = False
+        status = 500
+        response_bytes = 0
+
+        async def recording_receive() -> Message:
+            nonlocal truncated
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                room = self.max_body_bytes - len(body)
+                body.extend(chunk[:room])
+                truncated = truncated or len(chunk) > room
+            return message
+
+        async def recording_send(message: Message) -> None:
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        arrived = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            self._write(scope, arrived, time.perf_counter() - start, status, response_bytes, bytes(body), truncated)
+
+    def _write(
+        self,
+        scope: Scope,
+        arrived: float,
+        seconds: float,
+        status: int,
+        response_bytes: int,
+        body: bytes,
+        truncated: bool,
+    ) -> None:
+        route = scope.get("route")
+        record = {
+            "ts": arrived,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "query": scope["query_string"].decode("latin-1"),
+            "content_type": dict(scope["headers"]).get(b"content-type", b"").decode("latin-1") or None,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 3),
+            "response_bytes": response_bytes,
+        }
+        if body:
+            try:
+                record["body"] = body.decode()
+            except UnicodeDecodeError:
+                record["body_base64"] = base64.b64encode(body).decode()
+        if truncated:
+            record["body_truncated"] = True
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
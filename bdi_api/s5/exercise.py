@@ -1,8 +1,11 @@
+from datetime import date
 from typing import Annotated
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, status
 from fastapi.params import Query
+from sqlalchemy import text
 
+from bdi_api.db import get_engine, track_queries
 from bdi_api.settings import Settings
 
 settings = Settings()
@@ -14,6 +17,7 @@ s5 = APIRouter(
     },
     prefix="/api/s5",
     tags=["s5"],
+    dependencies=[Depends(track_queries)],
 )
 
 
@@ -98,3 +102,93 @@ def salary_history(emp_id: int) -> list[dict]:
     """
     # TODO: Query salary_history for the given employee, ordered by change_date
     return []
+
+
+SALARY_HISTORY_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_salary_history_employee_date ON salary_history (employee_id, change_date)"
+)
+
+# Salary of every employee hired by :as_of. The last change on or before the
+# date gives its `new_salary`; employees without one fall back to the `old_salary`
+# of their first later change, and finally to the current `employee.salary`.
+# Both windows partition and order exactly like the (employee_id, change_date)
+# index, so the engine can feed them from an index scan without sorting.
+SALARY_SNAPSHOT_SQL = """
+WITH last_before AS (
+    SELECT employee_id, new_salary AS salary,
+           ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY change_date DESC) AS rn
+    FROM salary_history
+    WHERE change_date <= :as_of
+), first_after AS (
+    SELECT employee_id, old_salary AS salary,
+           ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY change_date ASC) AS rn
+    FROM salary_history
+    WHERE change_date > :as_of
+)
+SELECT e.id AS employee_id, e.first_name, e.last_name,
+       e.department_id, d.name AS department_name,
+       COALESCE(b.salary, a.salary, e.salary) AS salary
+FROM employee e
+LEFT JOIN department d ON d.id = e.department_id
+LEFT JOIN last_before b ON b.employee_id = e.id AND b.rn = 1
+LEFT JOIN first_after a ON a.employee_id = e.id AND a.rn = 1
+WHERE e.hire_date <= :as_of
+"""
+
+
+# Databases (engine URLs) the salary_history index was created on
+_indexed_databases: set[str] = set()
+
+
+def _ensure_salary_history_index() -> None:
+    """Create the index of the as-of queries once per database, not as DDL on every request."""
+    engine = get_engine()
+    if str(engine.url) in _indexed_databases:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(SALARY_HISTORY_INDEX))
+    _indexed_databases.add(str(engine.url))
+
+
+@s5.get("/salaries/as-of")
+def salaries_as_of(
+    as_of: Annotated[
+        date,
+        Query(description="Date of the snapshot (YYYY-MM-DD)"),
+    ],
+) -> list[dict]:
+    """Return the salary every employee had on `as_of`, in a single query.
+
+    Each entry includes: employee_id, first_name, last_name, department_id, department_name, salary
+    """
+    _ensure_salary_history_index()
+    with get_engine().connect() as conn:
+        rows = conn.execute(
+            text(SALARY_SNAPSHOT_SQL + "ORDER BY e.id"),
+            {"as_of": as_of.isoformat()},
+        )
+        return [dict(row._mapping) for row in rows]
+
+
+@s5.get("/departments/payroll/as-of")
+def department_payroll_as_of(
+    as_of: Annotated[
+        date,
+        Query(description="Date of the snapshot (YYYY-MM-DD)"),
+    ],
+) -> list[dict]:
+    """Return the payroll of every department on `as_of`.
+
+    Each entry includes: department_id, department_name, employee_count, payroll
+    """
+    _ensure_salary_history_index()
+    query = f"""
+    WITH snapshot AS ({SALARY_SNAPSHOT_SQL})
+    SELECT department_id, department_name, COUNT(*) AS employee_count, SUM(salary) AS payroll
+    FROM snapshot
+    GROUP BY department_id, department_name
+    ORDER BY department_id
+    """
+    with get_engine().connect() as conn:
+        rows = conn.execute(text(query), {"as_of": as_of.isoformat()})
+        return [dict(row._mapping) for row in rows]
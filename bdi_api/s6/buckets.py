@@ -0,0 +1,110 @@
+"""Bucket pattern for aircraft positions.
+
+Instead of one document per position, the `position_buckets` collection holds one
+document per icao and time window:
+
+    {"icao": "a0b1c2", "window": <window start>, "count": 2, "latest": "2026-02-19T10:30:05Z",
+     "positions": [{"registration": ..., "type": ..., "lat": ..., "timestamp": ...}, ...]}
+
+so the collection and its indexes get `count` times smaller. A window holds at most
+`BDI_S6_BUCKET_MAX_POSITIONS` positions; extra ones open a new bucket for the same window.
+"""
+
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+
+def window_start(timestamp: str, seconds: int) -> datetime:
+    """Start of the `seconds`-long window holding `timestamp` (ISO 8601, UTC if it has no offset)."""
+    moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=timezone.utc)
+
+
+def bucket_updates(
+    documents: list[dict], seconds: int, max_positions: int
+) -> tuple[list[UpdateOne], list[list[int]], dict[int, str]]:
+    """Group position documents into upserts of at most `max_positions` each.
+
+    An upsert only matches a bucket with room for all of its positions, so a bucket never
+    goes over `max_positions`: a batch that does not fit opens a new bucket for the window.
+    Returns the operations, the indexes in `documents` each operation stores,
+    and the documents that cannot be bucketed, with their error.
+    """
+    groups: dict[tuple[str, datetime], list[int]] = {}
+    errors = {}
+    for i, document in enumerate(documents):
+        try:
+            window = window_start(document["timestamp"], seconds)
+        except ValueError as e:
+            errors[i] = f"timestamp: {e}"
+            continue
+        groups.setdefault((document["icao"], window), []).append(i)
+    operations = []
+    stored_by = []
+    for (icao, window), indexes in groups.items():
+        for start in range(0, len(indexes), max_positions):
+            chunk = indexes[start : start + max_positions]
+            members = [documents[i] for i in chunk]
+            operations.append(
+                UpdateOne(
+                    {"icao": icao, "window": window, "count": {"$lte": max_positions - len(members)}},
+                    {
+                        "$push": {"positions": {"$each": [_position(member) for member in members]}},
+                        "$inc": {"count": len(members)},
+                        "$max": {"latest": max(member["timestamp"] for member in members)},
+                    },
+                    upsert=True,
+                )
+            )
+            stored_by.append(chunk)
+    return operations, stored_by, errors
+
+
+def _position(document: dict) -> dict:
+    return {field: value for field, value in document.items() if field not in ("_id", "icao")}
+
+
+def latest_position(bucket: dict, icao: str) -> dict:
+    return {"icao": icao, **max(bucket["positions"], key=lambda position: position["timestamp"])}
+
+
+def count_by_type_pipeline() -> list[dict]:
+    return [
+        {"$unwind": "$positions"},
+        {"$group": {"_id": "$positions.type", "count": {"$sum": 1}}},
+    ]
+
+
+def registry_pipeline() -> list[dict]:
+    return [
+        {"$unwind": "$positions"},
+        {"$sort": {"icao": ASCENDING, "positions.timestamp": DESCENDING}},
+        {
+            "$group": {
+                "_id": "$icao",
+                "registration": {"$first": "$positions.registration"},
+                "type": {"$first": "$positions.type"},
+            }
+        },
+    ]
+
+
+def from_positions_pipeline(seconds: int) -> list[dict]:
+    """Regroup plain position documents into buckets (one per icao and window, without size cap)."""
+    window = {"$dateTrunc": {"date": {"$toDate": "$timestamp"}, "unit": "second", "binSize": seconds}}
+    return [
+        {
+            "$group": {
+                "_id": {"icao": "$icao", "window": window},
+                "positions": {"$push": "$$ROOT"},
+                "count": {"$sum": 1},
+                "latest": {"$max": "$timestamp"},
+            }
+        },
+        {"$set": {"icao": "$_id.icao", "window": "$_id.window"}},
+        {"$unset": ["_id", "positions._id", "positions.icao"]},
+    ]
@@ -1,10 +1,30 @@
-from typing import Annotated
+from typing import Annotated, Any, Literal
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 from fastapi.params import Query
 from pydantic import BaseModel
+from pymongo.write_concern import WriteConcern
 
+from bdi_api.s6 import jobs
+from bdi_api.s6.mongo import (
+    AIRCRAFT_PROJECTION,
+    aircraft,
+    count_stored,
+    delete_positions,
+    ensure_indexes,
+    explain_queries,
+    index_report,
+    insert_positions,
+    latest_position,
+    list_aircraft_query,
+    read_type_counts,
+    rebuild_aircraft_registry,
+    rebuild_buckets,
+    rebuild_type_counts,
+    storage_report,
+)
 from bdi_api.settings import Settings
+from bdi_api.streaming import MalformedBody, batched, iter_json_documents, validate_batch
 
 settings = Settings()
 
@@ -30,36 +50,144 @@ class AircraftPosition(BaseModel):
 
 
 @s6.post("/aircraft")
-def create_aircraft(position: AircraftPosition) -> dict:
+async def create_aircraft(position: AircraftPosition) -> dict:
     """Store an aircraft position document in MongoDB.
 
     Use the BDI_MONGO_URL environment variable to configure the connection.
     Start MongoDB with: make mongo
     Database name: bdi_aircraft
-    Collection name: positions
+    Collection name: positions (or position_buckets with BDI_S6_STORAGE_MODE=buckets)
     """
-    # TODO: Connect to MongoDB using pymongo.MongoClient(settings.mongo_url)
-    # TODO: Insert the position document into the 'positions' collection
-    # TODO: Return {"status": "ok"}
+    errors = await insert_positions([position.model_dump()])
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors[0])
     return {"status": "ok"}
 
 
+@s6.post("/aircraft/bulk")
+async def bulk_create_aircraft(
+    request: Request,
+    batch_size: Annotated[
+        int,
+        Query(description="Number of documents written per `insert_many` call", ge=1, le=100_000),
+    ] = settings.mongo_bulk_batch_size,
+    w: Annotated[
+        str,
+        Query(description='Write concern: number of acknowledging members ("0", "1", ...) or "majority"'),
+    ] = "1",
+    journal: Annotated[
+        bool,
+        Query(description="Acknowledge only once the batch is in the on-disk journal"),
+    ] = False,
+) -> dict:
+    """Store many aircraft positions sent as NDJSON (one document per line) or as a JSON array.
+
+    The body is parsed while it streams in, validated as `AircraftPosition` and written
+    with unordered `insert_many` batches, so invalid documents are reported without
+    stopping the rest.
+
+    Response example:
+    {"received": 2, "inserted": 1, "batches": [{"batch": 0, "received": 2, "inserted": 1,
+    "errors": [{"index": 1, "error": "lat: Field required"}]}]}
+    """
+    try:
+        write_concern = WriteConcern(w=int(w) if w.isdigit() else w, j=journal or None)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)) from e
+    report: dict[str, Any] = {"received": 0, "inserted": 0, "batches": []}
+    try:
+        async for batch in batched(iter_json_documents(request.stream()), batch_size):
+            result = await _insert_batch(write_concern, batch)
+            report["received"] += result["received"]
+            report["inserted"] += result["inserted"]
+            report["batches"].append({"batch": len(report["batches"]), **result})
+    except MalformedBody as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": str(e), **report}) from e
+    return report
+
+
+async def _insert_batch(write_concern: WriteConcern, batch: list[tuple[int, Any, str | None]]) -> dict:
+    documents, indexes, errors = validate_batch(batch, AircraftPosition)
+    failed = await insert_positions(documents, write_concern)
+    errors += [{"index": indexes[i], "error": error} for i, error in failed.items()]
+    inserted = len(documents) - len(failed)
+    return {"received": len(batch), "inserted": inserted, "errors": sorted(errors, key=lambda err: err["index"])}
+
+
 @s6.get("/aircraft/stats")
-def aircraft_stats() -> list[dict]:
+async def aircraft_stats() -> list[dict]:
     """Return aggregated statistics: count of positions grouped by aircraft type.
 
     Response example: [{"type": "B738", "count": 42}, {"type": "A320", "count": 38}]
 
-    Use MongoDB's aggregation pipeline with $group.
+    Reads the `type_counts` collection, kept up to date on every insert and delete,
+    so the cost does not grow with the number of positions.
     """
-    # TODO: Connect to MongoDB
-    # TODO: Use collection.aggregate() with $group on 'type' field
-    # TODO: Return list sorted by count descending
-    return []
+    return await read_type_counts()
+
+
+@s6.post("/aircraft/stats/rebuild")
+async def rebuild_aircraft_stats() -> list[dict]:
+    """Recompute the per-type counters from the positions collection and return the new stats.
+
+    Use it after writing to `positions` outside the API or if the counters drifted.
+    """
+    return await rebuild_type_counts()
+
+
+@s6.get("/diagnostics/indexes")
+async def index_diagnostics(
+    icao: Annotated[
+        str,
+        Query(description="ICAO used to build the per-aircraft queries"),
+    ] = "a0b1c2",
+) -> dict:
+    """Check the managed indexes exist and that no s6 query falls back to a COLLSCAN.
+
+    Response example: {"ok": true, "indexes": {"expected": [...], "present": [...], "missing": []},
+    "queries": {"get_aircraft": {"stages": ["LIMIT", "FETCH", "IXSCAN"], "collscan": false}, ...}}
+    """
+    indexes = await index_report()
+    queries = await explain_queries(icao)
+    ok = not any(report["missing"] for report in indexes.values())
+    ok = ok and not any(query["collscan"] for query in queries.values())
+    return {"ok": ok, "indexes": indexes, "queries": queries}
+
+
+@s6.post("/diagnostics/indexes")
+async def create_indexes() -> dict:
+    """Create the managed indexes now instead of waiting for the startup task. Existing ones are kept."""
+    return {"created": await ensure_indexes()}
+
+
+@s6.get("/diagnostics/storage")
+async def storage_diagnostics(
+    sample: Annotated[
+        int,
+        Query(description="Number of aircraft used to time the latest-position lookup", ge=1, le=1000),
+    ] = 50,
+) -> dict:
+    """Compare the plain (`positions`) and bucketed (`position_buckets`) storage modes.
+
+    For each one: number of documents and of stored positions, data, storage and index
+    sizes in bytes, and the latency of the latest-position lookup used by `get_aircraft`.
+    Fill `position_buckets` from `positions` first with `POST /api/s6/aircraft/buckets/rebuild`.
+    """
+    return await storage_report(sample)
+
+
+@s6.post("/aircraft/buckets/rebuild")
+async def rebuild_position_buckets() -> dict:
+    """Regroup the documents of `positions` into `position_buckets`, replacing its content.
+
+    Use it to migrate to `BDI_S6_STORAGE_MODE=buckets` or to compare both modes on the same data.
+    """
+    return {"buckets": await rebuild_buckets()}
 
 
 @s6.get("/aircraft/")
-def list_aircraft(
+async def list_aircraft(
+    response: Response,
     page: Annotated[
         int,
         Query(description="Page number (1-indexed)", ge=1),
@@ -68,38 +196,80 @@ def list_aircraft(
         int,
         Query(description="Number of results per page", ge=1, le=100),
     ] = 20,
+    after: Annotated[
+        str | None,
+        Query(description="Return the aircraft after this icao (cursor pagination, `page` is ignored)"),
+    ] = None,
 ) -> list[dict]:
-    """List all aircraft with pagination.
+    """List all aircraft ordered by icao, with pagination.
+
+    Each result includes: icao, registration, type.
+    Reads the `aircraft` registry (one document per aircraft, upserted on insert).
+    With `after`, a page is a range scan on its `_id` index however deep it is, whereas
+    `page` still has to skip every previous aircraft. When the page is full, the
+    `X-Next-After` response header holds the cursor of the next one.
+    """
+    cursor = aircraft().find(list_aircraft_query(after), AIRCRAFT_PROJECTION).sort("_id").limit(page_size)
+    if after is None:
+        cursor = cursor.skip((page - 1) * page_size)
+    results = await cursor.to_list()
+    if len(results) == page_size:
+        response.headers["X-Next-After"] = results[-1]["icao"]
+    return results
+
 
-    Each result should include: icao, registration, type.
-    Use MongoDB's skip() and limit() for pagination.
+@s6.post("/aircraft/registry/rebuild")
+async def rebuild_registry() -> dict:
+    """Recompute the `aircraft` registry used by the listing from the positions collection.
+
+    Use it after writing to `positions` outside the API.
     """
-    # TODO: Connect to MongoDB
-    # TODO: Query distinct aircraft, apply skip/limit for pagination
-    # TODO: Return list of dicts with icao, registration, type
-    return []
+    return {"aircraft": await rebuild_aircraft_registry()}
 
 
 @s6.get("/aircraft/{icao}")
-def get_aircraft(icao: str) -> dict:
+async def get_aircraft(icao: str) -> dict:
     """Get the latest position data for a specific aircraft.
 
     Return the most recent document matching the given ICAO code.
     If not found, return 404.
     """
-    # TODO: Connect to MongoDB
-    # TODO: Find the latest document for this icao (sort by timestamp descending)
-    # TODO: Return 404 if not found
-    return {}
+    document = await latest_position(icao)
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Aircraft '{icao}' not found")
+    return document
 
 
 @s6.delete("/aircraft/{icao}")
-def delete_aircraft(icao: str) -> dict:
+async def delete_aircraft(
+    icao: str,
+    response: Response,
+    mode: Annotated[
+        Literal["auto", "sync", "background"],
+        Query(description="`auto` deletes in the background above BDI_S6_DELETE_BACKGROUND_THRESHOLD documents"),
+    ] = "auto",
+) -> dict:
     """Remove all position records for an aircraft.
 
     Returns the number of deleted documents.
+
+    Large deletions run as a background job deleting throttled batches: the response is then
+    a `202` with the job (`id`, `status`, `deleted` so far); follow it at
+    `GET /api/s6/aircraft/deletions/{job_id}`.
     """
-    # TODO: Connect to MongoDB
-    # TODO: Delete all documents matching the icao
-    # TODO: Return {"deleted": <count>}
-    return {"deleted": 0}
+    if mode == "auto":
+        threshold = settings.s6_delete_background_threshold
+        mode = "background" if await count_stored(icao, limit=threshold + 1) > threshold else "sync"
+    if mode == "sync":
+        return {"deleted": await delete_positions(icao)}
+    response.status_code = status.HTTP_202_ACCEPTED
+    return jobs.start_deletion(icao).as_dict()
+
+
+@s6.get("/aircraft/deletions/{job_id}")
+async def get_deletion_job(job_id: str) -> dict:
+    """Progress of a background deletion: `status` (running, done, failed, cancelled) and `deleted` so far."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Deletion job '{job_id}' not found")
+    return job.as_dict()
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+from bdi_api.s6.mongo import delete_positions_batch
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+logger = logging.getLogger("uvicorn.error")
+
+MAX_FINISHED_JOBS = 100
+
+
+@dataclass
+class DeletionJob:
+    icao: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "running"
+    deleted: int = 0
+    batches: int = 0
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+    error: str | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+_jobs: OrderedDict[str, DeletionJob] = OrderedDict()
+_tasks: dict[str, asyncio.Task] = {}
+
+
+def start_deletion(icao: str) -> DeletionJob:
+    """Delete the positions of `icao` in the background, in throttled batches.
+
+    Returns the job already running for `icao` if there is one, instead of racing it.
+    """
+    for job in _jobs.values():
+        if job.icao == icao and job.id in _tasks:
+            return job
+    job = DeletionJob(icao=icao)
+    _jobs[job.id] = job
+    _tasks[job.id] = asyncio.create_task(_run(job))
+    _forget_finished_jobs()
+    return job
+
+
+def get_job(job_id: str) -> DeletionJob | None:
+    return _jobs.get(job_id)
+
+
+async def _run(job: DeletionJob) -> None:
+    try:
+        while deleted := await delete_positions_batch(job.icao, settings.s6_delete_batch_size):
+            job.deleted += deleted
+            job.batches += 1
+            await asyncio.sleep(settings.s6_delete_throttle_ms / 1000)
+        job.status = "done"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    except Exception as e:
+        logger.exception("Deletion job %s for %s failed", job.id, job.icao)
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+        _tasks.pop(job.id, None)
+
+
+def _forget_finished_jobs() -> None:
+    finished = [job_id for job_id, job in _jobs.items() if job.finished_at is not None]
+    for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+async def cancel_all() -> None:
+    """Stop the running jobs, e.g. before the MongoDB client is closed."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
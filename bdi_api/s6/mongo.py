@@ -0,0 +1,459 @@
+import logging
+import statistics
+import time
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any
+
+from pymongo import ASCENDING, DESCENDING, AsyncMongoClient, IndexModel, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+from bdi_api.metrics import MongoCommandTimer
+from bdi_api.s6 import buckets
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+logger = logging.getLogger("uvicorn.error")
+
+DATABASE = "bdi_aircraft"
+POSITIONS = "positions"
+# Number of positions per aircraft type, maintained at write time for aircraft_stats
+TYPE_COUNTS = "type_counts"
+# One document per aircraft ({_id: icao, registration, type}), upserted at write time for list_aircraft
+AIRCRAFT = "aircraft"
+# Positions grouped per icao and time window, used when BDI_S6_STORAGE_MODE=buckets (see buckets.py)
+BUCKETS = "position_buckets"
+
+# Every query below must be served by one of these. Check it with GET /api/s6/diagnostics/indexes
+POSITION_INDEXES = [
+    # get_aircraft (latest position of an icao), delete_aircraft and rebuilding the aircraft registry
+    IndexModel([("icao", ASCENDING), ("timestamp", DESCENDING)], name="icao_timestamp"),
+    # Rebuilding the type counters
+    IndexModel([("type", ASCENDING)], name="type"),
+]
+BUCKET_INDEXES = [
+    # Appending to the current bucket of an icao
+    IndexModel([("icao", ASCENDING), ("window", ASCENDING)], name="icao_window"),
+    # get_aircraft and delete_aircraft
+    IndexModel([("icao", ASCENDING), ("latest", DESCENDING)], name="icao_latest"),
+]
+
+LATEST_FIRST = [("timestamp", DESCENDING)]
+LATEST_BUCKET_FIRST = [("latest", DESCENDING)]
+
+
+_client: AsyncMongoClient | None = None
+
+
+def open_client() -> AsyncMongoClient:
+    """Create the shared client. Called once from the app lifespan.
+
+    The client owns the connection pool, so it must not be created per request.
+    It connects lazily: an unreachable server only fails the requests that need it.
+    """
+    global _client
+    _client = AsyncMongoClient(
+        settings.mongo_url,
+        maxPoolSize=settings.mongo_max_pool_size,
+        minPoolSize=settings.mongo_min_pool_size,
+        serverSelectionTimeoutMS=settings.mongo_timeout_ms,
+        connectTimeoutMS=settings.mongo_timeout_ms,
+        socketTimeoutMS=settings.mongo_socket_timeout_ms,
+        event_listeners=[MongoCommandTimer()],
+    )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_client() -> AsyncMongoClient:
+    if _client is None:
+        raise RuntimeError("The MongoDB client is not open: it is created in the app lifespan")
+    return _client
+
+
+def positions() -> AsyncCollection:
+    return get_client()[DATABASE][POSITIONS]
+
+
+def type_counts() -> AsyncCollection:
+    return get_client()[DATABASE][TYPE_COUNTS]
+
+
+def aircraft() -> AsyncCollection:
+    return get_client()[DATABASE][AIRCRAFT]
+
+
+def position_buckets() -> AsyncCollection:
+    return get_client()[DATABASE][BUCKETS]
+
+
+def use_buckets() -> bool:
+    return settings.s6_storage_mode == "buckets"
+
+
+def by_icao(icao: str) -> dict:
+    return {"icao": icao}
+
+
+AIRCRAFT_PROJECTION = {"_id": 0, "icao": "$_id", "registration": 1, "type": 1}
+
+
+def list_aircraft_query(after: str | None) -> dict:
+    """Aircraft after the `after` icao cursor: a range scan on the registry `_id` index."""
+    return {"_id": {"$gt": after}} if after is not None else {}
+
+
+async def register_aircraft(documents: Iterable[dict]) -> None:
+    """Upsert the registry entry of every aircraft in `documents`.
+
+    Known registration and type are kept when a position comes without them.
+    """
+    latest: dict[str, dict] = {}
+    for document in documents:
+        entry = latest.setdefault(document["icao"], {})
+        entry.update({field: document[field] for field in ("registration", "type") if document.get(field) is not None})
+    if not latest:
+        return
+    updates = []
+    for icao, fields in latest.items():
+        missing = {field: None for field in ("registration", "type") if field not in fields}
+        update = {"$set": fields, "$setOnInsert": missing}
+        updates.append(UpdateOne({"_id": icao}, {op: value for op, value in update.items() if value}, upsert=True))
+    await aircraft().bulk_write(updates, ordered=False)
+
+
+def rebuild_registry_pipeline() -> list[dict]:
+    return [
+        {"$sort": {"icao": ASCENDING, "timestamp": DESCENDING}},
+        {"$group": {"_id": "$icao", "registration": {"$first": "$registration"}, "type": {"$first": "$type"}}},
+    ]
+
+
+async def rebuild_aircraft_registry() -> int:
+    """Recompute the registry from the stored positions. Returns the number of registered aircraft."""
+    if use_buckets():
+        await position_buckets().aggregate([*buckets.registry_pipeline(), {"$out": AIRCRAFT}], allowDiskUse=True)
+    else:
+        await positions().aggregate([*rebuild_registry_pipeline(), {"$out": AIRCRAFT}])
+    return await aircraft().estimated_document_count()
+
+
+def count_by_type_pipeline(match: dict | None = None) -> list[dict]:
+    group = {"$group": {"_id": "$type", "count": {"$sum": 1}}}
+    if match:
+        # Served by the index of the match: a sort on `type` would lead the planner to the type index instead
+        return [{"$match": match}, group]
+    # The leading $sort lets the planner read `type` from its index instead of scanning documents
+    return [{"$sort": {"type": ASCENDING}}, group]
+
+
+async def update_type_counts(counts: Counter, sign: int = 1) -> None:
+    """Add (or with `sign=-1`, subtract) per-type position counts to the counters collection."""
+    if not counts:
+        return
+    collection = type_counts()
+    await collection.bulk_write(
+        [UpdateOne({"_id": type_}, {"$inc": {"count": sign * n}}, upsert=True) for type_, n in counts.items()],
+        ordered=False,
+    )
+    if sign < 0:
+        await collection.delete_many({"count": {"$lte": 0}})
+
+
+def count_types(documents: Iterable[dict]) -> Counter:
+    return Counter(document.get("type") for document in documents)
+
+
+async def insert_positions(documents: list[dict], write_concern: WriteConcern | None = None) -> dict[int, str]:
+    """Store position documents in the configured storage mode and update the counters and registry.
+
+    Returns the documents that could not be stored, as `{index in documents: error}`.
+    """
+    if use_buckets():
+        errors = await _insert_buckets(documents, write_concern)
+    else:
+        errors = await _insert_documents(documents, write_concern)
+    stored = [document for i, document in enumerate(documents) if i not in errors]
+    await update_type_counts(count_types(stored))
+    await register_aircraft(stored)
+    return errors
+
+
+async def _insert_documents(documents: list[dict], write_concern: WriteConcern | None) -> dict[int, str]:
+    if not documents:
+        return {}
+    try:
+        await positions().with_options(write_concern=write_concern).insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        return {err["index"]: err["errmsg"] for err in e.details["writeErrors"]}
+    return {}
+
+
+async def _insert_buckets(documents: list[dict], write_concern: WriteConcern | None) -> dict[int, str]:
+    operations, stored_by, errors = buckets.bucket_updates(
+        documents, settings.s6_bucket_seconds, settings.s6_bucket_max_positions
+    )
+    if not operations:
+        return errors
+    try:
+        await position_buckets().with_options(write_concern=write_concern).bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details["writeErrors"]:
+            errors.update(dict.fromkeys(stored_by[err["index"]], err["errmsg"]))
+    return errors
+
+
+async def latest_position(icao: str) -> dict | None:
+    if use_buckets():
+        bucket = await position_buckets().find_one(by_icao(icao), {"_id": 0, "positions": 1}, sort=LATEST_BUCKET_FIRST)
+        return buckets.latest_position(bucket, icao) if bucket else None
+    return await positions().find_one(by_icao(icao), {"_id": 0}, sort=LATEST_FIRST)
+
+
+async def delete_positions(icao: str) -> int:
+    """Delete every position of `icao` and take them off the type counters and the registry.
+
+    The counters are decremented by what the deletes actually removed, not by a count taken
+    before them, so positions written meanwhile cannot make them drift: they are either
+    deleted and uncounted, or kept and still counted.
+    """
+    if use_buckets():
+        counts = await _delete_buckets(icao)
+    else:
+        counts = await _delete_documents(icao)
+    await update_type_counts(counts, sign=-1)
+    await aircraft().delete_one({"_id": icao})
+    return sum(counts.values())
+
+
+async def _delete_documents(icao: str) -> Counter:
+    # One delete per type, each on the icao index, so its deleted_count is that type's decrement
+    types = [row["_id"] async for row in await positions().aggregate(count_by_type_pipeline(by_icao(icao)))]
+    counts = Counter()
+    for type_ in types:
+        result = await positions().delete_many({**by_icao(icao), "type": type_})
+        counts[type_] += result.deleted_count
+    return counts
+
+
+async def _delete_buckets(icao: str, limit: int | None = None) -> Counter:
+    # A bucket mixes types: each one is removed and returned atomically, with the positions it held then
+    counts = Counter()
+    removed = 0
+    while limit is None or removed < limit:
+        bucket = await position_buckets().find_one_and_delete(by_icao(icao), {"_id": 0, "positions.type": 1})
+        if bucket is None:
+            break
+        counts.update(count_types(bucket["positions"]))
+        removed += 1
+    return counts
+
+
+async def _delete_documents_batch(icao: str, batch_size: int) -> Counter:
+    # The ids are grouped by type: each delete_many's deleted_count is then that type's decrement,
+    # also when another request deleted some of them between the find and the delete
+    ids_by_type = defaultdict(list)
+    async for document in positions().find(by_icao(icao), {"_id": 1, "type": 1}).limit(batch_size):
+        ids_by_type[document.get("type")].append(document["_id"])
+    counts = Counter()
+    for type_, ids in ids_by_type.items():
+        result = await positions().delete_many({"_id": {"$in": ids}})
+        counts[type_] += result.deleted_count
+    return counts
+
+
+async def count_stored(icao: str, limit: int) -> int:
+    """Documents (positions or buckets) stored for `icao`, counting no further than `limit`."""
+    collection = position_buckets() if use_buckets() else positions()
+    return await collection.count_documents(by_icao(icao), limit=limit)
+
+
+async def delete_positions_batch(icao: str, batch_size: int) -> int:
+    """Delete at most `batch_size` documents of `icao` and take them off the type counters.
+
+    Returns the number of positions deleted, 0 once none is left (the registry entry goes then).
+    Each batch is a bounded `$in` on `_id` (or `batch_size` single bucket deletes), so it never
+    holds the primary for long. Only what this call actually deleted is taken off the counters.
+    """
+    while True:
+        if use_buckets():
+            counts = await _delete_buckets(icao, limit=batch_size)
+        else:
+            counts = await _delete_documents_batch(icao, batch_size)
+        if deleted := sum(counts.values()):
+            break
+        # Nothing deleted: either no position is left, or another request took this batch first
+        if not await count_stored(icao, limit=1):
+            await aircraft().delete_one({"_id": icao})
+            return 0
+    await update_type_counts(counts, sign=-1)
+    return deleted
+
+
+async def read_type_counts() -> list[dict]:
+    cursor = type_counts().find({"count": {"$gt": 0}}, {"_id": 0, "type": "$_id", "count": 1})
+    return await cursor.sort("count", DESCENDING).to_list()
+
+
+async def rebuild_type_counts() -> list[dict]:
+    """Recompute the counters from the stored positions, e.g. after writes that bypassed the API.
+
+    `$out` replaces the counters collection atomically once the aggregation finishes.
+    """
+    if use_buckets():
+        pipeline = [*buckets.count_by_type_pipeline(), {"$out": TYPE_COUNTS}]
+        await position_buckets().aggregate(pipeline, allowDiskUse=True)
+    else:
+        await positions().aggregate([*count_by_type_pipeline(), {"$out": TYPE_COUNTS}])
+    return await read_type_counts()
+
+
+async def rebuild_buckets() -> int:
+    """Regroup the plain `positions` documents into `position_buckets`. Returns the number of buckets."""
+    pipeline = [*buckets.from_positions_pipeline(settings.s6_bucket_seconds), {"$out": BUCKETS}]
+    await positions().aggregate(pipeline, allowDiskUse=True)
+    await position_buckets().create_indexes(BUCKET_INDEXES)
+    return await position_buckets().estimated_document_count()
+
+
+async def _first(collection: AsyncCollection, pipeline: list[dict]) -> dict | None:
+    rows = await (await collection.aggregate(pipeline)).to_list(1)
+    return rows[0] if rows else None
+
+
+async def _collection_report(collection: AsyncCollection, positions_pipeline: list[dict]) -> dict:
+    try:
+        stats = (await _first(collection, [{"$collStats": {"storageStats": {}}}]) or {}).get("storageStats", {})
+    except OperationFailure:
+        stats = {}
+    stored = (await _first(collection, positions_pipeline) or {"positions": 0})["positions"]
+    return {
+        "documents": stats.get("count", 0),
+        "positions": stored,
+        "data_size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+        "index_sizes": stats.get("indexSizes", {}),
+    }
+
+
+async def _latency_ms(lookup: Callable[[str], Awaitable], icaos: list[str]) -> dict:
+    timings = []
+    for icao in icaos:
+        start = time.perf_counter()
+        await lookup(icao)
+        timings.append((time.perf_counter() - start) * 1000)
+    if not timings:
+        return {}
+    return {"samples": len(timings), "median": round(statistics.median(timings), 3), "max": round(max(timings), 3)}
+
+
+async def storage_report(sample: int) -> dict:
+    """Size of the plain and bucketed collections and latest-position latency on each of them."""
+    icaos = [row["_id"] for row in await aircraft().find({}, {"_id": 1}).limit(sample).to_list()]
+    return {
+        "mode": settings.s6_storage_mode,
+        "documents": {
+            **await _collection_report(positions(), [{"$count": "positions"}]),
+            "latest_position_ms": await _latency_ms(
+                lambda icao: positions().find_one(by_icao(icao), {"_id": 0}, sort=LATEST_FIRST), icaos
+            ),
+        },
+        "buckets": {
+            **await _collection_report(
+                position_buckets(), [{"$group": {"_id": None, "positions": {"$sum": "$count"}}}]
+            ),
+            "latest_position_ms": await _latency_ms(
+                lambda icao: position_buckets().find_one(by_icao(icao), {"_id": 0}, sort=LATEST_BUCKET_FIRST), icaos
+            ),
+        },
+    }
+
+
+async def ensure_indexes() -> list[str]:
+    """Create the managed indexes. Safe to call repeatedly: existing ones are left alone."""
+    try:
+        created = await positions().create_indexes(POSITION_INDEXES)
+        created += await position_buckets().create_indexes(BUCKET_INDEXES)
+    except PyMongoError as e:
+        logger.warning("Could not create the s6 indexes: %s", e)
+        return []
+    logger.info("s6 indexes ready: %s", ", ".join(created))
+    return created
+
+
+async def index_report() -> dict:
+    report = {}
+    for collection, indexes in ((positions(), POSITION_INDEXES), (position_buckets(), BUCKET_INDEXES)):
+        expected = [index.document["name"] for index in indexes]
+        present = sorted(await collection.index_information())
+        report[collection.name] = {
+            "expected": expected,
+            "present": present,
+            "missing": [name for name in expected if name not in present],
+        }
+    return report
+
+
+def _plan_stages(explain: Any) -> list[str]:
+    """All plan stage names found anywhere in an explain() output."""
+    if isinstance(explain, dict):
+        stages = [explain["stage"]] if isinstance(explain.get("stage"), str) else []
+        return stages + [stage for value in explain.values() for stage in _plan_stages(value)]
+    if isinstance(explain, list):
+        return [stage for value in explain for stage in _plan_stages(value)]
+    return []
+
+
+async def explain_queries(icao: str) -> dict:
+    """Query planner output for every query issued by the s6 endpoints."""
+    collection = positions()
+    db = collection.database
+    explains = {
+        "get_aircraft": await collection.find(by_icao(icao), {"_id": 0}).sort(LATEST_FIRST).limit(1).explain(),
+        "delete_aircraft": await db.command(
+            {
+                "explain": {"delete": POSITIONS, "deletes": [{"q": by_icao(icao), "limit": 0}]},
+                "verbosity": "queryPlanner",
+            }
+        ),
+        "list_aircraft": await aircraft()
+        .find(list_aircraft_query(icao), AIRCRAFT_PROJECTION)
+        .sort("_id", ASCENDING)
+        .limit(20)
+        .explain(),
+        "rebuild_aircraft_registry": await db.command(
+            "aggregate", POSITIONS, pipeline=rebuild_registry_pipeline(), explain=True
+        ),
+        "count_deleted_types": await db.command(
+            "aggregate", POSITIONS, pipeline=count_by_type_pipeline(by_icao(icao)), explain=True
+        ),
+        "rebuild_type_counts": await db.command(
+            "aggregate", POSITIONS, pipeline=count_by_type_pipeline(), explain=True
+        ),
+        "get_aircraft_buckets": await position_buckets()
+        .find(by_icao(icao), {"_id": 0, "positions": 1})
+        .sort(LATEST_BUCKET_FIRST)
+        .limit(1)
+        .explain(),
+        "delete_aircraft_buckets": await db.command(
+            {
+                "explain": {"findAndModify": BUCKETS, "query": by_icao(icao), "remove": True},
+                "verbosity": "queryPlanner",
+            }
+        ),
+    }
+    report = {}
+    for name, explain in explains.items():
+        stages = list(dict.fromkeys(_plan_stages(explain)))
+        report[name] = {"stages": stages, "collscan": "COLLSCAN" in stages}
+    return report
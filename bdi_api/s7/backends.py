@@ -0,0 +1,70 @@
+"""Storage backends behind the s7 endpoints, selected with BDI_S7_GRAPH_BACKEND.
+
+Both expose the same methods with the same results: `neo4j` runs the Cypher queries of
+`bdi_api.s7.graph`, `memory` keeps the graph in this process as CSR arrays
+(see `bdi_api.s7.memory`) and answers without any network round-trip.
+"""
+
+from functools import lru_cache
+from typing import Protocol
+
+from neo4j import READ_ACCESS
+
+from bdi_api.metrics import timed
+from bdi_api.s7 import graph
+from bdi_api.s7.memory import MemoryGraph
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+
+class GraphBackend(Protocol):
+    def merge_persons(self, rows: list[dict]) -> int: ...
+
+    def merge_relationships(self, relationship_type: str, rows: list[dict]) -> list[int]: ...
+
+    def list_persons(self, after: str | None, limit: int) -> list[dict]: ...
+
+    def friends(self, name: str) -> list[dict] | None: ...
+
+    def recommendations(self, name: str) -> list[dict] | None: ...
+
+
+class Neo4jGraph:
+    """Writes go to the leader; reads are managed read transactions, routed to readers in a cluster."""
+
+    def merge_persons(self, rows: list[dict]) -> int:
+        with timed("neo4j", "merge_persons"), graph.get_driver().session() as session:
+            return session.execute_write(graph.merge_persons, rows)
+
+    def merge_relationships(self, relationship_type: str, rows: list[dict]) -> list[int]:
+        with timed("neo4j", "merge_relationships"), graph.get_driver().session() as session:
+            return session.execute_write(graph.merge_relationships, relationship_type, rows)
+
+    def list_persons(self, after: str | None, limit: int) -> list[dict]:
+        with (
+            timed("neo4j", "list_persons"),
+            graph.get_driver().session(default_access_mode=READ_ACCESS, fetch_size=min(limit, 1000)) as session,
+        ):
+            return session.execute_read(graph.list_persons, after, limit)
+
+    def friends(self, name: str) -> list[dict] | None:
+        with timed("neo4j", "friends"), graph.get_driver().session(default_access_mode=READ_ACCESS) as session:
+            return session.execute_read(graph.friends, name)
+
+    def recommendations(self, name: str) -> list[dict] | None:
+        with timed("neo4j", "recommendations"), graph.get_driver().session(default_access_mode=READ_ACCESS) as session:
+            return session.execute_read(graph.recommendations, name)
+
+
+BACKENDS: dict[str, type[GraphBackend]] = {"neo4j": Neo4jGraph, "memory": MemoryGraph}
+
+
+def get_backend() -> GraphBackend:
+    return _backend(settings.s7_graph_backend)
+
+
+@lru_cache
+def _backend(name: str) -> GraphBackend:
+    # Cached so the memory backend keeps its data between requests
+    return BACKENDS[name]()
@@ -0,0 +1,82 @@
+"""Bounded LRU cache of friend recommendations.
+
+Recommendations are read far more often than the graph changes, so they are kept
+per person until a write can change them. A new FRIENDS_WITH between `a` and `b`
+only changes the recommendations of `a`, `b` and their direct friends: those are
+the only entries dropped.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+
+
+class RecommendationCache:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, list[dict]] = OrderedDict()
+        # Bumped by every invalidation, so a result computed before it is not stored after it
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, name: str) -> tuple[list[dict] | None, int]:
+        """The cached recommendations (None on a miss) and the generation to pass to `put`."""
+        with self._lock:
+            recommendations = self._entries.get(name)
+            if recommendations is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(name)
+            return recommendations, self._generation
+
+    def put(self, name: str, recommendations: list[dict], generation: int) -> None:
+        with self._lock:
+            if self.max_size <= 0 or generation != self._generation:
+                return
+            self._entries[name] = recommendations
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, names: Iterable[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            for name in names:
+                if self._entries.pop(name, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_mentioning(self, names: Iterable[str]) -> None:
+        """Drop the entries of `names` and those recommending any of them (e.g. after their city changed)."""
+        names = set(names)
+        with self._lock:
+            stale = [
+                name
+                for name, recommendations in self._entries.items()
+                if name in names or any(recommendation["name"] in names for recommendation in recommendations)
+            ]
+        self.invalidate(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
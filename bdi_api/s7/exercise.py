@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
+from collections.abc import Callable
+from typing import Annotated, Any
 
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.params import Query
+from pydantic import BaseModel, Field
+
+from bdi_api.s7 import graph
+from bdi_api.s7.backends import get_backend
+from bdi_api.s7.cache import RecommendationCache
 from bdi_api.settings import Settings
+from bdi_api.streaming import MalformedBody, batched, iter_json_documents, validate_batch
 
 settings = Settings()
 
+recommendation_cache = RecommendationCache(settings.s7_recommendation_cache_size)
+
 s7 = APIRouter(
     responses={
         status.HTTP_404_NOT_FOUND: {"description": "Not found"},
@@ -24,7 +35,7 @@ class PersonCreate(BaseModel):
 class RelationshipCreate(BaseModel):
     from_person: str
     to_person: str
-    relationship_type: str = "FRIENDS_WITH"
+    relationship_type: str = Field(default=graph.FRIENDS_WITH, pattern=graph.RELATIONSHIP_TYPE.pattern)
 
 
 @s7.post("/graph/person")
@@ -33,23 +44,118 @@ def create_person(person: PersonCreate) -> dict:
 
     Use the BDI_NEO4J_URL environment variable to configure the connection.
     Start Neo4J with: make neo4j
+    Or keep the graph in memory with BDI_S7_GRAPH_BACKEND=memory
     """
-    # TODO: Connect to Neo4J using neo4j.GraphDatabase.driver(settings.neo4j_url, auth=(settings.neo4j_user, settings.neo4j_password))
-    # TODO: Create a Person node with the given properties
-    # TODO: Return {"status": "ok", "name": person.name}
+    get_backend().merge_persons([person.model_dump()])
+    recommendation_cache.invalidate_mentioning([person.name])
     return {"status": "ok", "name": person.name}
 
 
+@s7.post("/graph/persons/bulk")
+async def bulk_create_persons(
+    request: Request,
+    batch_size: Annotated[
+        int,
+        Query(description="Number of persons written per UNWIND transaction", ge=1, le=100_000),
+    ] = settings.neo4j_bulk_batch_size,
+) -> dict:
+    """Create or update many persons sent as NDJSON (one person per line) or as a JSON array.
+
+    Each batch is one `UNWIND ... MERGE` transaction instead of one round-trip per person.
+
+    Response example:
+    {"received": 2, "written": 1, "batches": [{"batch": 0, "received": 2, "written": 1,
+    "errors": [{"index": 1, "error": "age: Field required"}]}]}
+    """
+
+    def write(rows: list[dict], indexes: list[int]) -> tuple[int, list[dict]]:
+        written = get_backend().merge_persons(rows)
+        recommendation_cache.invalidate_mentioning(row["name"] for row in rows)
+        return written, []
+
+    return await _bulk_import(request, batch_size, PersonCreate, write)
+
+
+@s7.post("/graph/relationships/bulk")
+async def bulk_create_relationships(
+    request: Request,
+    batch_size: Annotated[
+        int,
+        Query(description="Number of relationships written per UNWIND transaction", ge=1, le=100_000),
+    ] = settings.neo4j_bulk_batch_size,
+) -> dict:
+    """Create many relationships sent as NDJSON (one per line) or as a JSON array.
+
+    Each batch is one `UNWIND ... MATCH ... MERGE` transaction per relationship type.
+    Relationships whose persons do not exist are reported as errors.
+    """
+
+    def write(rows: list[dict], indexes: list[int]) -> tuple[int, list[dict]]:
+        by_type: dict[str, list[dict]] = {}
+        for row, index in zip(rows, indexes, strict=True):
+            by_type.setdefault(row["relationship_type"], []).append({**row, "index": index})
+        written = set()
+        for relationship_type, typed_rows in by_type.items():
+            written.update(get_backend().merge_relationships(relationship_type, typed_rows))
+        if written and graph.FRIENDS_WITH in by_type:
+            # Too many people may be affected to look up all their friends
+            recommendation_cache.clear()
+        errors = [{"index": index, "error": "Person not found"} for index in indexes if index not in written]
+        return len(written), errors
+
+    return await _bulk_import(request, batch_size, RelationshipCreate, write)
+
+
+async def _bulk_import(
+    request: Request,
+    batch_size: int,
+    model: type[BaseModel],
+    write: Callable[[list[dict], list[int]], tuple[int, list[dict]]],
+) -> dict:
+    report: dict[str, Any] = {"received": 0, "written": 0, "batches": []}
+    try:
+        async for batch in batched(iter_json_documents(request.stream()), batch_size):
+            rows, indexes, errors = validate_batch(batch, model)
+            written = 0
+            if rows:
+                written, write_errors = await run_in_threadpool(write, rows, indexes)
+                errors += write_errors
+            report["received"] += len(batch)
+            report["written"] += written
+            report["batches"].append(
+                {
+                    "batch": len(report["batches"]),
+                    "received": len(batch),
+                    "written": written,
+                    "errors": sorted(errors, key=lambda err: err["index"]),
+                }
+            )
+    except MalformedBody as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": str(e), **report}) from e
+    return report
+
+
 @s7.get("/graph/persons")
-def list_persons() -> list[dict]:
-    """List all person nodes.
+def list_persons(
+    response: Response,
+    after: Annotated[
+        str | None,
+        Query(description="Return the persons whose name comes after this one (cursor pagination)"),
+    ] = None,
+    limit: Annotated[
+        int,
+        Query(description="Number of persons per page", ge=1, le=1000),
+    ] = 100,
+) -> list[dict]:
+    """List person nodes ordered by name, one page at a time.
 
     Each result should include: name, city, age.
+    When the page is full, the `X-Next-After` response header holds the cursor of the next one.
     """
-    # TODO: Connect to Neo4J
-    # TODO: MATCH (p:Person) RETURN p
-    # TODO: Return list of dicts with name, city, age
-    return []
+    persons = get_backend().list_persons(after, limit)
+    if len(persons) == limit:
+        response.headers["X-Next-After"] = persons[-1]["name"]
+    return persons
 
 
 @s7.get("/graph/person/{name}/friends")
@@ -59,11 +165,10 @@ def get_friends(name: str) -> list[dict]:
     Returns all persons connected by a FRIENDS_WITH relationship (any direction).
     If person not found, return 404.
     """
-    # TODO: Connect to Neo4J
-    # TODO: First check if person exists, return 404 if not
-    # TODO: MATCH (p:Person {name: name})-[:FRIENDS_WITH]-(friend:Person)
-    # TODO: Return list of friend dicts with name, city, age
-    raise HTTPException(status_code=404, detail=f"Person '{name}' not found")
+    friends = get_backend().friends(name)
+    if friends is None:
+        raise HTTPException(status_code=404, detail=f"Person '{name}' not found")
+    return friends
 
 
 @s7.post("/graph/relationship")
@@ -72,10 +177,17 @@ def create_relationship(rel: RelationshipCreate) -> dict:
 
     Both persons must exist. Returns 404 if either is not found.
     """
-    # TODO: Connect to Neo4J
-    # TODO: Verify both persons exist
-    # TODO: CREATE (a)-[:FRIENDS_WITH]->(b)
-    # TODO: Return {"status": "ok", "from": rel.from_person, "to": rel.to_person}
+    row = {**rel.model_dump(), "index": 0}
+    backend = get_backend()
+    written = backend.merge_relationships(rel.relationship_type, [row])
+    if not written:
+        raise HTTPException(status_code=404, detail=f"Person '{rel.from_person}' or '{rel.to_person}' not found")
+    if rel.relationship_type == graph.FRIENDS_WITH:
+        # Only the two persons and their direct friends can get different recommendations
+        affected = {rel.from_person, rel.to_person}
+        for name in (rel.from_person, rel.to_person):
+            affected.update(friend["name"] for friend in backend.friends(name) or [])
+        recommendation_cache.invalidate(affected)
     return {"status": "ok", "from": rel.from_person, "to": rel.to_person}
 
 
@@ -89,8 +201,20 @@ def get_recommendations(name: str) -> list[dict]:
 
     Each result should include: name, city, mutual_friends (count).
     """
-    # TODO: Connect to Neo4J
-    # TODO: First check if person exists, return 404 if not
-    # TODO: Find friends-of-friends not already friends
-    # TODO: Count mutual friends and sort descending
-    raise HTTPException(status_code=404, detail=f"Person '{name}' not found")
+    recommendations, generation = recommendation_cache.get(name)
+    if recommendations is not None:
+        return recommendations
+    recommendations = get_backend().recommendations(name)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail=f"Person '{name}' not found")
+    recommendation_cache.put(name, recommendations, generation)
+    return recommendations
+
+
+@s7.get("/graph/cache/stats")
+def get_cache_stats() -> dict:
+    """Hits, misses, hit rate, evictions and invalidations of the recommendation cache.
+
+    Size it with BDI_S7_RECOMMENDATION_CACHE_SIZE (0 disables it).
+    """
+    return recommendation_cache.stats()
@@ -0,0 +1,150 @@
+import logging
+import re
+
+from neo4j import Driver, GraphDatabase, ManagedTransaction
+from neo4j.exceptions import DriverError, Neo4jError
+
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+logger = logging.getLogger("uvicorn.error")
+
+# Makes every `MATCH (p:Person {name: ...})` an index lookup and keeps MERGE from duplicating people
+PERSON_NAME_CONSTRAINT = "CREATE CONSTRAINT person_name IF NOT EXISTS FOR (p:Person) REQUIRE p.name IS UNIQUE"
+
+# Relationship types cannot be query parameters, so they are validated before being put in the query
+RELATIONSHIP_TYPE = re.compile(r"^[A-Z][A-Z0-9_]*$")
+
+FRIENDS_WITH = "FRIENDS_WITH"
+
+PERSON_FIELDS = "p.name AS name, p.city AS city, p.age AS age"
+
+# `IS NOT NULL` and `>` are both index predicates, so the index returns the page already ordered
+FIRST_PERSONS_PAGE = f"MATCH (p:Person) WHERE p.name IS NOT NULL RETURN {PERSON_FIELDS} ORDER BY name LIMIT $limit"
+NEXT_PERSONS_PAGE = f"MATCH (p:Person) WHERE p.name > $after RETURN {PERSON_FIELDS} ORDER BY name LIMIT $limit"
+
+
+_driver: Driver | None = None
+
+
+def open_driver() -> Driver:
+    """Create the shared driver. Called once from the app lifespan.
+
+    The driver owns the connection pool (and, with a `neo4j://` URL, the cluster routing
+    table), so it must not be created per request. It connects lazily.
+    With the server unreachable, a request fails with `ServiceUnavailable` after
+    BDI_NEO4J_MAX_TRANSACTION_RETRY_TIME instead of the driver's default 30s of retries.
+    """
+    global _driver
+    _driver = GraphDatabase.driver(
+        settings.neo4j_url,
+        auth=(settings.neo4j_user, settings.neo4j_password),
+        connection_timeout=settings.neo4j_connection_timeout,
+        max_transaction_retry_time=settings.neo4j_max_transaction_retry_time,
+    )
+    return _driver
+
+
+def close_driver() -> None:
+    global _driver
+    if _driver is not None:
+        _driver.close()
+        _driver = None
+
+
+def get_driver() -> Driver:
+    if _driver is None:
+        raise RuntimeError("The Neo4J driver is not open: it is created in the app lifespan")
+    return _driver
+
+
+def ensure_constraints() -> bool:
+    """Create the managed constraint. Called once from the app lifespan, safe to call repeatedly.
+
+    A single auto-commit query rather than `execute_query`, which would retry: the lifespan
+    runs it in a thread, and shutdown must not wait for a retry loop against a missing server.
+    """
+    try:
+        with get_driver().session() as session:
+            session.run(PERSON_NAME_CONSTRAINT).consume()
+    except (DriverError, Neo4jError) as e:
+        logger.warning("Could not create the s7 constraints: %s", e)
+        return False
+    logger.info("s7 constraints ready")
+    return True
+
+
+def check_relationship_type(relationship_type: str) -> str:
+    if not RELATIONSHIP_TYPE.match(relationship_type):
+        raise ValueError(f"Invalid relationship type '{relationship_type}': use UPPER_SNAKE_CASE")
+    return relationship_type
+
+
+def person_exists(tx: ManagedTransaction, name: str) -> bool:
+    return tx.run("MATCH (p:Person {name: $name}) RETURN count(p) > 0 AS found", name=name).single()["found"]
+
+
+def merge_persons(tx: ManagedTransaction, rows: list[dict]) -> int:
+    """Create or update a batch of persons in a single query."""
+    result = tx.run(
+        "UNWIND $rows AS row MERGE (p:Person {name: row.name}) SET p.city = row.city, p.age = row.age "
+        "RETURN count(p) AS written",
+        rows=rows,
+    )
+    return result.single()["written"]
+
+
+def merge_relationships(tx: ManagedTransaction, relationship_type: str, rows: list[dict]) -> list[int]:
+    """Create a batch of relationships in a single query. Returns the `index` of the rows whose persons exist."""
+    result = tx.run(
+        "UNWIND $rows AS row "
+        "MATCH (a:Person {name: row.from_person}) "
+        "MATCH (b:Person {name: row.to_person}) "
+        f"MERGE (a)-[:{check_relationship_type(relationship_type)}]->(b) "
+        "RETURN row.index AS index",
+        rows=rows,
+    )
+    return [record["index"] for record in result]
+
+
+def list_persons(tx: ManagedTransaction, after: str | None, limit: int) -> list[dict]:
+    """One page of persons ordered by name, starting after the name `after`.
+
+    The range and order come from the `Person.name` index, so a page costs the same
+    however deep it is, and records are pulled from the server in `fetch_size` batches
+    as they are converted instead of being materialized by the driver first.
+    The first page has its own query text: with `$after IS NULL OR ...` the planner cannot
+    turn the predicate into an index range and falls back to a label scan and a sort.
+    """
+    if after is None:
+        result = tx.run(FIRST_PERSONS_PAGE, limit=limit)
+    else:
+        result = tx.run(NEXT_PERSONS_PAGE, after=after, limit=limit)
+    return [record.data() for record in result]
+
+
+def friends(tx: ManagedTransaction, name: str) -> list[dict] | None:
+    """Friends of `name` in either direction, or None if the person does not exist."""
+    if not person_exists(tx, name):
+        return None
+    return tx.run(
+        f"MATCH (:Person {{name: $name}})-[:FRIENDS_WITH]-(p:Person) RETURN DISTINCT {PERSON_FIELDS} ORDER BY name",
+        name=name,
+    ).data()
+
+
+def recommendations(tx: ManagedTransaction, name: str) -> list[dict] | None:
+    """Friends of friends of `name` who are not friends yet, most mutual friends first.
+
+    None if the person does not exist.
+    """
+    if not person_exists(tx, name):
+        return None
+    return tx.run(
+        "MATCH (me:Person {name: $name})-[:FRIENDS_WITH]-(friend:Person)-[:FRIENDS_WITH]-(p:Person) "
+        "WHERE p <> me AND NOT (me)-[:FRIENDS_WITH]-(p) "
+        "RETURN p.name AS name, p.city AS city, count(DISTINCT friend) AS mutual_friends "
+        "ORDER BY mutual_friends DESC, name",
+        name=name,
+    ).data()
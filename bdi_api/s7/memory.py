@@ -0,0 +1,131 @@
+"""In-process graph engine for the s7 endpoints.
+
+Persons get integer ids in insertion order and FRIENDS_WITH is kept as a symmetric
+adjacency matrix in CSR form: the friends of node `i` are `indices[indptr[i]:indptr[i + 1]]`.
+Friends-of-friends are then the concatenation of the friends' rows (one row of A @ A),
+counted with `np.bincount`, so a recommendation costs O(sum of the friends' degrees)
+without any per-node Python loop or database round-trip.
+
+The CSR arrays are rebuilt lazily after writes, which suits the read-mostly workload.
+"""
+
+import bisect
+import threading
+
+import numpy as np
+
+from bdi_api.s7.graph import FRIENDS_WITH
+
+
+class MemoryGraph:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids: dict[str, int] = {}
+        self._persons: list[dict] = []
+        self._edges: dict[str, set[tuple[int, int]]] = {}
+        self._csr: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self._persons)
+
+    def merge_persons(self, rows: list[dict]) -> int:
+        with self._lock:
+            for row in rows:
+                person = {"name": row["name"], "city": row["city"], "age": row["age"]}
+                node = self._ids.get(row["name"])
+                if node is None:
+                    self._ids[row["name"]] = len(self._persons)
+                    self._persons.append(person)
+                    self._csr = None
+                else:
+                    self._persons[node] = person
+        return len(rows)
+
+    def merge_relationships(self, relationship_type: str, rows: list[dict]) -> list[int]:
+        """Same contract as `graph.merge_relationships`: the `index` of the rows whose persons exist."""
+        written = []
+        with self._lock:
+            edges = self._edges.setdefault(relationship_type, set())
+            for row in rows:
+                source, target = self._ids.get(row["from_person"]), self._ids.get(row["to_person"])
+                if source is None or target is None:
+                    continue
+                if relationship_type == FRIENDS_WITH:
+                    # Read in both directions, so each pair is stored once
+                    source, target = min(source, target), max(source, target)
+                edges.add((source, target))
+                written.append(row["index"])
+            if written and relationship_type == FRIENDS_WITH:
+                self._csr = None
+        return written
+
+    def list_persons(self, after: str | None, limit: int) -> list[dict]:
+        _, _, _, by_name = self._arrays()
+        start = 0
+        if after is not None:
+            start = bisect.bisect_right(by_name, after, key=lambda node: self._persons[node]["name"])
+        return [dict(self._persons[node]) for node in by_name[start : start + limit]]
+
+    def friends(self, name: str) -> list[dict] | None:
+        node = self._ids.get(name)
+        if node is None:
+            return None
+        indptr, indices, rank, _ = self._arrays()
+        row = indices[indptr[node] : indptr[node + 1]]
+        return [dict(self._persons[friend]) for friend in row[np.argsort(rank[row])]]
+
+    def recommendations(self, name: str) -> list[dict] | None:
+        node = self._ids.get(name)
+        if node is None:
+            return None
+        indptr, indices, rank, _ = self._arrays()
+        friends = indices[indptr[node] : indptr[node + 1]]
+        mutual = np.bincount(_gather_rows(indptr, indices, friends), minlength=len(rank))
+        mutual[friends] = 0
+        mutual[node] = 0
+        candidates = np.flatnonzero(mutual)
+        # Most mutual friends first, then by name
+        candidates = candidates[np.lexsort((rank[candidates], -mutual[candidates]))]
+        return [
+            {
+                "name": self._persons[candidate]["name"],
+                "city": self._persons[candidate]["city"],
+                "mutual_friends": int(mutual[candidate]),
+            }
+            for candidate in candidates
+        ]
+
+    def _arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """CSR `indptr` and `indices` of FRIENDS_WITH, the rank of every node by name and the nodes by name."""
+        with self._lock:
+            if self._csr is None:
+                self._csr = _build_csr(len(self._persons), self._edges.get(FRIENDS_WITH, set()), list(self._ids))
+            return self._csr
+
+
+def _build_csr(
+    size: int, pairs: set[tuple[int, int]], names: list[str]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    edges = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+    # Both directions, without duplicating self-loops
+    loops = edges[:, 0] == edges[:, 1]
+    sources = np.concatenate([edges[:, 0], edges[~loops, 1]])
+    targets = np.concatenate([edges[:, 1], edges[~loops, 0]])
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    by_name = np.argsort(np.array(names, dtype=object), kind="stable")
+    rank = np.empty(size, dtype=np.int64)
+    rank[by_name] = np.arange(size)
+    return indptr, targets[order], rank, by_name
+
+
+def _gather_rows(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Concatenation of `indices[indptr[r]:indptr[r + 1]]` for every `r` in `rows`, without a Python loop."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    if not lengths.sum():
+        return np.empty(0, dtype=indices.dtype)
+    # Position of each gathered element: its row start plus its offset inside the row
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return indices[np.repeat(starts, lengths) + offsets]
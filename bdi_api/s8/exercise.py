@@ -1,6 +1,16 @@
-from fastapi import APIRouter, status
+import json
+from collections.abc import Iterator
+from datetime import date
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.params import Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from bdi_api.db import track_queries
+from bdi_api.s8 import gold
+from bdi_api.s8.silver import iter_co2, read_aircraft_page
 from bdi_api.settings import Settings
 
 settings = Settings()
@@ -12,6 +22,7 @@ s8 = APIRouter(
     },
     prefix="/api/s8",
     tags=["s8"],
+    dependencies=[Depends(track_queries)],
 )
 
 
@@ -31,16 +42,40 @@ class AircraftCO2Return(BaseModel):
 
 
 @s8.get("/aircraft/")
-def list_aircraft(num_results: int = 100, page: int = 0) -> list[AircraftReturn]:
+def list_aircraft(
+    num_results: Annotated[int, Query(ge=1, le=10_000)] = 100,
+    page: Annotated[int, Query(ge=0)] = 0,
+) -> list[AircraftReturn]:
     """List all aircraft with enriched data, ordered by ICAO ascending.
 
     The data should come from the silver layer (processed by the Airflow DAG).
     Paginated with `num_results` per page and `page` number (0-indexed).
+
+    Only the Parquet row groups holding the page are read, located with the page index
+    the pipeline writes next to the aircraft table.
     """
-    # TODO: Read enriched aircraft data from your storage (S3 silver, database, or local)
-    # TODO: Order by ICAO ascending
-    # TODO: Apply pagination using num_results and page
-    return []
+    return [AircraftReturn(**aircraft) for aircraft in read_aircraft_page(num_results, page)]
+
+
+@s8.get("/aircraft/co2")
+def list_aircraft_co2(
+    day: Annotated[date, Query(description="Day to compute, e.g. 2023-11-01")],
+    icao: Annotated[
+        list[str] | None,
+        Query(description="Only these aircraft (repeat the parameter). All aircraft seen on the day if omitted"),
+    ] = None,
+) -> StreamingResponse:
+    """Compute `hours_flown` and `co2` for a whole fleet on a day, like `GET /aircraft/{icao}/co2`.
+
+    All aircraft are computed in one group-by pass over the day's silver data and the
+    results are streamed as NDJSON, one `AircraftCO2Return` per line ordered by icao.
+    """
+
+    def lines() -> Iterator[str]:
+        for result in iter_co2(day, icao):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @s8.get("/aircraft/{icao}/co2")
@@ -54,9 +89,17 @@ def get_aircraft_co2(icao: str, day: str) -> AircraftCO2Return:
     - fuel_used_kg = hours_flown * galph * 3.04
     - co2_tons = (fuel_used_kg * 3.15) / 907.185
     - If fuel consumption rate is not available for this aircraft type, return None for co2
+
+    Days materialized in the gold layer (`bdi_api.s8.gold`) are one primary-key read;
+    other days are counted from the silver files.
     """
-    # TODO: Count observations for this ICAO on the given day
-    # TODO: Calculate hours_flown
-    # TODO: Look up fuel consumption rate by aircraft type
-    # TODO: Calculate CO2 emissions
+    try:
+        parsed_day = date.fromisoformat(day)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid day: {e}") from e
+    result = gold.read_co2(icao, parsed_day)
+    if result is not None:
+        return AircraftCO2Return(**result)
+    for result in iter_co2(parsed_day, [icao]):
+        return AircraftCO2Return(**result)
     return AircraftCO2Return(icao=icao, hours_flown=0.0, co2=None)
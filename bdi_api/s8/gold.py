@@ -0,0 +1,111 @@
+"""Gold layer of s8: observations per aircraft and day, in the `BDI_DB_URL` database.
+
+The pipeline materializes a day once with `build_day` (or
+`python -m bdi_api.s8.gold 2023-11-01`), then `get_aircraft_co2` is a primary-key
+read plus arithmetic instead of a scan of the day's silver files.
+"""
+
+import sys
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from itertools import islice
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Engine,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    delete,
+    insert,
+    select,
+)
+
+from bdi_api.db import get_engine
+from bdi_api.s8 import reference, silver
+
+INSERT_BATCH_SIZE = 1000
+
+metadata = MetaData()
+
+# The (day, icao) primary key is the index of the point lookup
+daily_observations = Table(
+    "aircraft_daily_observations",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("icao", String(16), primary_key=True),
+    Column("type", String(16)),
+    Column("observation_count", Integer, nullable=False),
+    Column("hours_flown", Float, nullable=False),
+)
+
+# Days materialized in daily_observations: an aircraft missing from a loaded day did not fly
+daily_loads = Table(
+    "aircraft_daily_observation_loads",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("aircraft", Integer, nullable=False),
+    Column("loaded_at", DateTime, nullable=False),
+)
+
+
+@lru_cache
+def _ensure_tables(engine: Engine) -> None:
+    metadata.create_all(engine)
+
+
+def build_day(day: date) -> int:
+    """Replace the gold rows of `day` with the counts of the silver layer. Returns the number of aircraft."""
+    engine = get_engine()
+    _ensure_tables(engine)
+    rows = (
+        {**observation, "day": day, "hours_flown": silver.hours_flown(observation["observation_count"])}
+        for observation in silver.iter_observations(day)
+    )
+    aircraft = 0
+    with engine.begin() as conn:
+        conn.execute(delete(daily_observations).where(daily_observations.c.day == day))
+        conn.execute(delete(daily_loads).where(daily_loads.c.day == day))
+        while batch := list(islice(rows, INSERT_BATCH_SIZE)):
+            conn.execute(insert(daily_observations), batch)
+            aircraft += len(batch)
+        conn.execute(insert(daily_loads).values(day=day, aircraft=aircraft, loaded_at=datetime.now(timezone.utc)))
+    return aircraft
+
+
+def read_co2(icao: str, day: date) -> dict | None:
+    """`{"icao", "hours_flown", "co2"}` from the gold layer, or None if `day` is not materialized."""
+    engine = get_engine()
+    _ensure_tables(engine)
+    query = (
+        select(daily_loads.c.day, daily_observations.c.type, daily_observations.c.hours_flown)
+        .select_from(
+            daily_loads.outerjoin(
+                daily_observations,
+                and_(daily_observations.c.day == daily_loads.c.day, daily_observations.c.icao == icao),
+            )
+        )
+        .where(daily_loads.c.day == day)
+    )
+    with engine.connect() as conn:
+        row = conn.execute(query).first()
+    if row is None:
+        return None
+    if row.hours_flown is None:
+        return {"icao": icao, "hours_flown": 0.0, "co2": None}
+    galph = reference.fuel_rates().get(row.type)
+    return {"icao": icao, "hours_flown": row.hours_flown, "co2": silver.co2_tons(row.hours_flown, galph)}
+
+
+def main() -> None:
+    for day in sys.argv[1:]:
+        print(f"{day}: {build_day(date.fromisoformat(day))} aircraft")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Stages of the s8 pipeline: download -> bronze -> parse/clean -> enrich -> silver -> gold.
+
+The same functions are the tasks of the Airflow DAG (`dags/s8_aircraft_pipeline.py`)
+and of the local runner below, so both produce the same silver files. Run it locally,
+offline against a mirror of the source site, with:
+
+    python -m bdi_api.s8.pipeline --day 2023-11-01 --files 100 --offline data/mirror
+
+Outputs are cached under `<local_dir>/pipeline-cache`: a re-run only redoes the stages
+whose inputs changed.
+"""
+
+import argparse
+import gzip
+import json
+import time
+from datetime import date
+from itertools import accumulate
+from os.path import join
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from bdi_api.s8 import gold, reference, silver
+from bdi_api.s8.reference import ReferenceData
+from bdi_api.s8.runner import Runner, Task
+from bdi_api.s8.sources import HttpSource, LocalHttp, LocalStore, ObjectStore, RemoteHttp, S3Store
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+# One file every 5 seconds, each row of a file is one observation
+FILE_SECONDS = 5
+
+SILVER_SCHEMA = pa.schema(
+    [
+        ("icao", pa.string()),
+        ("registration", pa.string()),
+        ("type", pa.string()),
+        ("timestamp", pa.float64()),
+        ("lat", pa.float64()),
+        ("lon", pa.float64()),
+        ("alt_baro", pa.float64()),
+        ("ground_speed", pa.float64()),
+        ("emergency", pa.string()),
+    ]
+)
+
+AIRCRAFT_SCHEMA = pa.schema([*((field, pa.string()) for field in silver.AIRCRAFT_FIELDS), ("last_seen", pa.float64())])
+
+
+def file_names(count: int) -> list[str]:
+    """The first `count` files of a day: 000000Z.json.gz, 000005Z.json.gz, ..."""
+    seconds = range(0, count * FILE_SECONDS, FILE_SECONDS)
+    return [f"{s // 3600:02d}{s // 60 % 60:02d}{s % 60:02d}Z.json.gz" for s in seconds]
+
+
+def source_url(day: date, name: str) -> str:
+    return f"{settings.source_url}/{day:%Y/%m/%d}/{name}"
+
+
+def bronze_key(day: date, name: str) -> str:
+    return f"bronze/day={day.isoformat()}/{name}"
+
+
+def silver_key(day: date) -> str:
+    # Where bdi_api.s8.silver reads it when the store is BDI_LOCAL_DIR
+    return f"silver/tracking/day={day.isoformat()}/part-00000.parquet"
+
+
+# Latest known registration, type and metadata of every aircraft, merged into the previous table
+AIRCRAFT_SQL = """
+SELECT
+    icao,
+    arg_max(registration, last_seen) AS registration,
+    arg_max(type, last_seen) AS type,
+    arg_max(owner, last_seen) AS owner,
+    arg_max(manufacturer, last_seen) AS manufacturer,
+    arg_max(model, last_seen) AS model,
+    max(last_seen) AS last_seen
+FROM (
+    SELECT icao, registration, type, owner, manufacturer, model, timestamp AS last_seen FROM observations
+    UNION ALL BY NAME
+    SELECT * FROM previous
+)
+GROUP BY icao
+ORDER BY icao
+"""
+
+
+def download(day: date, name: str, *, http: HttpSource) -> bytes:
+    return http.get(source_url(day, name))
+
+
+def store_bronze(day: date, name: str, raw: bytes, *, store: ObjectStore) -> str:
+    key = bronze_key(day, name)
+    store.put(key, raw)
+    return key
+
+
+def parse(raw: bytes) -> pa.Table:
+    """One row per aircraft of a readsb-hist file, cleaned into `SILVER_SCHEMA`."""
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    data = json.loads(raw)
+    rows = [
+        {
+            "icao": aircraft["hex"].lower(),
+            "registration": aircraft.get("r"),
+            "type": aircraft.get("t"),
+            "timestamp": data["now"] - aircraft.get("seen", 0),
+            "lat": aircraft.get("lat"),
+            "lon": aircraft.get("lon"),
+            # On the ground, readsb reports the string "ground"
+            "alt_baro": 0.0 if aircraft.get("alt_baro") == "ground" else aircraft.get("alt_baro"),
+            "ground_speed": aircraft.get("gs"),
+            "emergency": aircraft.get("emergency"),
+        }
+        for aircraft in data.get("aircraft", [])
+        if "hex" in aircraft
+    ]
+    return pa.Table.from_pylist(rows, schema=SILVER_SCHEMA)
+
+
+def enrich(reference_versions: tuple, table: pa.Table, *, reference: ReferenceData) -> pa.Table:
+    """Add the aircraft database columns. `reference_versions` only makes the cache follow reference changes."""
+    return reference.enrich(table)
+
+
+def write_silver(day: date, *tables: pa.Table, store: ObjectStore) -> str:
+    """Write the day's enriched observations as one Parquet file, ordered by icao and time."""
+    table = pa.concat_tables(tables).sort_by([("icao", "ascending"), ("timestamp", "ascending")])
+    key = silver_key(day)
+    store.put(key, _parquet(table))
+    return key
+
+
+def write_aircraft(day: date, *tables: pa.Table, store: ObjectStore) -> str:
+    """Merge the day's aircraft into the silver aircraft table, ordered by icao, and rewrite its page index.
+
+    Row groups are `BDI_S8_ROW_GROUP_SIZE` rows with min/max statistics, and the page index
+    lists the first row of each, so a page of `list_aircraft` only reads the row groups it covers.
+    """
+    if store.exists(silver.AIRCRAFT_KEY):
+        previous = pq.read_table(pa.BufferReader(store.get(silver.AIRCRAFT_KEY)))
+    else:
+        previous = AIRCRAFT_SCHEMA.empty_table()
+    connection = duckdb.connect()
+    connection.register("observations", pa.concat_tables(tables))
+    connection.register("previous", previous)
+    aircraft = connection.execute(AIRCRAFT_SQL).fetch_arrow_table().cast(AIRCRAFT_SCHEMA)
+    data = _parquet(aircraft)
+    metadata = pq.read_metadata(pa.BufferReader(data))
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    store.put(silver.AIRCRAFT_KEY, data)
+    page_index = {"rows": aircraft.num_rows, "row_group_offsets": [0, *accumulate(sizes)][:-1]}
+    store.put(silver.AIRCRAFT_PAGE_INDEX_KEY, json.dumps(page_index).encode())
+    return silver.AIRCRAFT_KEY
+
+
+def _parquet(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, row_group_size=settings.s8_row_group_size, write_statistics=True)
+    return sink.getvalue().to_pybytes()
+
+
+def load_gold(day: date, silver: str) -> int:
+    return gold.build_day(day)
+
+
+def build_tasks(day: date, count: int, http: HttpSource, store: ObjectStore, load: bool = True) -> list[Task]:
+    current = reference.current()
+    tasks = []
+    enriched = []
+    for name in file_names(count):
+        tasks += [
+            Task(f"download/{name}", download, args=(day, name), resources={"http": http}),
+            Task(f"bronze/{name}", store_bronze, ("download/" + name,), (day, name), {"store": store}, cache=False),
+            Task(f"parse/{name}", parse, ("download/" + name,), pool="cpu"),
+            Task(f"enrich/{name}", enrich, ("parse/" + name,), (current.versions,), {"reference": current}),
+        ]
+        enriched.append(f"enrich/{name}")
+    # Writers always run: their output may have been deleted, or they may target another store or database
+    tasks.append(Task("silver", write_silver, tuple(enriched), (day,), {"store": store}, cache=False))
+    tasks.append(Task("aircraft", write_aircraft, tuple(enriched), (day,), {"store": store}, cache=False))
+    if load:
+        tasks.append(Task("gold", load_gold, ("silver",), (day,), cache=False))
+    return tasks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--day", type=date.fromisoformat, default=date(2023, 11, 1))
+    parser.add_argument("--files", type=int, default=100, help="Number of files of the day to process")
+    parser.add_argument("--offline", metavar="DIR", help="Read the source files from this mirror of the site")
+    parser.add_argument("--s3", action="store_true", help="Write bronze and silver to BDI_S3_BUCKET")
+    parser.add_argument("--io-workers", type=int, default=8)
+    parser.add_argument("--cpu-workers", type=int, default=None)
+    parser.add_argument("--cache-entries", type=int, default=2000, help="Task outputs kept in the cache")
+    args = parser.parse_args()
+
+    http = LocalHttp(args.offline, settings.source_url) if args.offline else RemoteHttp()
+    store = S3Store(settings.s3_bucket) if args.s3 else LocalStore(settings.local_dir)
+    runner = Runner(join(settings.local_dir, "pipeline-cache"), args.io_workers, args.cpu_workers, args.cache_entries)
+    start = time.perf_counter()
+    # Gold is built from the local silver files
+    runner.run(build_tasks(args.day, args.files, http, store, load=not args.s3))
+    stages: dict[str, list] = {}
+    for run in runner.runs:
+        stages.setdefault(run.name.split("/")[0], []).append(run)
+    print(f"{'stage':<10} {'tasks':>7} {'cached':>7} {'task s':>9}")
+    for stage, runs in stages.items():
+        print(f"{stage:<10} {len(runs):>7} {sum(r.cached for r in runs):>7} {sum(r.seconds for r in runs):>9.2f}")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
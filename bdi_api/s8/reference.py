@@ -0,0 +1,125 @@
+"""Reference data of s8, loaded once and swapped when the source files change.
+
+* `<local_dir>/aircraft_type_fuel_consumption_rates.json`: fuel rates by aircraft type, kept as a
+  `type -> galph` dict.
+* `<local_dir>/aircraft_database.csv`: `icao, registration, type, owner, manufacturer, model`,
+  kept as an Arrow table sorted by icao: one aircraft is a binary search on the icao column
+  and a batch is enriched with one hash join.
+
+`current()` checks the files' modification times and, when one changed, builds the new
+version and swaps it in one assignment. Callers keep the `ReferenceData` they got, so a
+request or a pipeline batch never mixes two versions.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from os.path import join
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
+
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+AIRCRAFT_COLUMNS = ["icao", "registration", "type", "owner", "manufacturer", "model"]
+# Only filled when the observation does not carry them
+FALLBACK_COLUMNS = ["registration", "type"]
+
+
+def fuel_rates_path() -> str:
+    return join(settings.local_dir, "aircraft_type_fuel_consumption_rates.json")
+
+
+def aircraft_database_path() -> str:
+    return join(settings.local_dir, "aircraft_database.csv")
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    fuel_rates: dict[str, float]
+    # Sorted by icao
+    aircraft: pa.Table
+    icaos: np.ndarray
+    versions: tuple[int | None, int | None]
+
+    def aircraft_info(self, icao: str) -> dict | None:
+        position = int(np.searchsorted(self.icaos, icao))
+        if position == len(self.icaos) or self.icaos[position] != icao:
+            return None
+        return self.aircraft.slice(position, 1).to_pylist()[0]
+
+    def enrich(self, batch: pa.Table) -> pa.Table:
+        """Add the aircraft database columns to a batch with an `icao` column, in one hash join.
+
+        `registration` and `type` from the batch win over the database ones.
+        """
+        positions = pc.index_in(pc.utf8_lower(batch["icao"]), value_set=self.aircraft["icao"])
+        for column in AIRCRAFT_COLUMNS[1:]:
+            values = self.aircraft[column].take(positions)
+            if column in batch.column_names:
+                if column not in FALLBACK_COLUMNS:
+                    continue
+                values = pc.coalesce(batch[column], values.cast(batch[column].type))
+                batch = batch.set_column(batch.column_names.index(column), column, values)
+            else:
+                batch = batch.append_column(column, values)
+        return batch
+
+
+_current: ReferenceData | None = None
+_lock = threading.Lock()
+
+
+def current() -> ReferenceData:
+    """The reference data matching the files on disk, reloaded only when they changed."""
+    global _current
+    versions = (_mtime(fuel_rates_path()), _mtime(aircraft_database_path()))
+    reference = _current
+    if reference is not None and reference.versions == versions:
+        return reference
+    with _lock:
+        if _current is None or _current.versions != versions:
+            _current = _load(versions)
+        return _current
+
+
+def fuel_rates() -> dict[str, float]:
+    return current().fuel_rates
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _load(versions: tuple[int | None, int | None]) -> ReferenceData:
+    fuel_rates = {}
+    if versions[0] is not None:
+        with open(fuel_rates_path()) as f:
+            rates = json.load(f)
+        fuel_rates = {
+            aircraft_type: rate["galph"] for aircraft_type, rate in rates.items() if rate.get("galph") is not None
+        }
+    schema = pa.schema([(column, pa.string()) for column in AIRCRAFT_COLUMNS])
+    if versions[1] is None:
+        aircraft = schema.empty_table()
+    else:
+        aircraft = csv.read_csv(
+            aircraft_database_path(),
+            convert_options=csv.ConvertOptions(column_types=schema, include_columns=AIRCRAFT_COLUMNS),
+        )
+        aircraft = aircraft.set_column(0, "icao", pc.utf8_lower(aircraft["icao"]))
+        aircraft = aircraft.sort_by("icao")
+    return ReferenceData(
+        fuel_rates=fuel_rates,
+        aircraft=aircraft,
+        icaos=aircraft["icao"].to_numpy(zero_copy_only=False).astype(str),
+        versions=versions,
+    )
@@ -0,0 +1,147 @@
+"""In-process executor for DAGs of pipeline tasks.
+
+Tasks whose dependencies are done run in parallel, on a thread pool (`pool="io"`) or a
+process pool (`pool="cpu"`). Each task's output is cached on disk under a hash of what
+determines it: the task function, its `args` and the content of its upstream outputs.
+A re-run therefore skips every task whose inputs did not change, and anything
+downstream of a changed input runs again.
+
+`resources` are handed to the function but not hashed: use them for clients,
+stores and other objects that do not change the result. For the same reason, tasks
+writing somewhere (a store, a database) are declared with `cache=False` and always run:
+the cache cannot tell whether their output is still there.
+
+The cache keeps the `max_entries` most recently used outputs.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from os.path import join
+from typing import Any, Literal
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    fn: Callable[..., Any]
+    # Outputs of these tasks are passed after `args`, in this order
+    upstream: tuple[str, ...] = ()
+    args: tuple = ()
+    resources: dict[str, Any] = field(default_factory=dict)
+    pool: Literal["io", "cpu"] = "io"
+    # False for tasks with side effects: they run every time, their output is only hashed
+    cache: bool = True
+
+
+@dataclass
+class TaskRun:
+    name: str
+    cached: bool
+    seconds: float
+
+
+class Runner:
+    def __init__(
+        self, cache_dir: str, io_workers: int = 8, cpu_workers: int | None = None, max_entries: int = 2000
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.max_entries = max_entries
+        self.runs: list[TaskRun] = []
+
+    def run(self, tasks: list[Task]) -> dict[str, Any]:
+        """Run every task once its upstream tasks are done. Returns the outputs by task name."""
+        by_name = {task.name: task for task in tasks}
+        for task in tasks:
+            missing = [name for name in task.upstream if name not in by_name]
+            if missing:
+                raise ValueError(f"Task {task.name} depends on unknown tasks {missing}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        outputs: dict[str, Any] = {}
+        digests: dict[str, str] = {}
+        pending = {task.name for task in tasks}
+        running: dict[Future, tuple[Task, str, float]] = {}
+        self.runs = []
+        with (
+            ThreadPoolExecutor(self.io_workers) as io_pool,
+            ProcessPoolExecutor(self.cpu_workers) as cpu_pool,
+        ):
+            pools: dict[str, Executor] = {"io": io_pool, "cpu": cpu_pool}
+            while pending or running:
+                ready = [name for name in pending if all(up in outputs for up in by_name[name].upstream)]
+                if not ready and not running:
+                    raise ValueError(f"Tasks {sorted(pending)} are part of a cycle")
+                for name in sorted(ready):
+                    pending.remove(name)
+                    task = by_name[name]
+                    key = self._key(task, digests)
+                    cached = self._read_cache(key) if task.cache else None
+                    if cached is not None:
+                        outputs[name], digests[name] = cached
+                        self.runs.append(TaskRun(name, cached=True, seconds=0.0))
+                        continue
+                    arguments = (*task.args, *(outputs[up] for up in task.upstream))
+                    future = pools[task.pool].submit(task.fn, *arguments, **task.resources)
+                    running[future] = (task, key, time.perf_counter())
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, key, start = running.pop(future)
+                    output = future.result()
+                    outputs[task.name] = output
+                    if task.cache:
+                        digests[task.name] = self._write_cache(key, output)
+                    else:
+                        digests[task.name] = hashlib.sha256(pickle.dumps(output)).hexdigest()
+                    self.runs.append(TaskRun(task.name, cached=False, seconds=time.perf_counter() - start))
+        self._prune()
+        logger.info("Pipeline done: %d tasks, %d from cache", len(self.runs), sum(run.cached for run in self.runs))
+        return outputs
+
+    def _key(self, task: Task, digests: dict[str, str]) -> str:
+        fn = getattr(task.fn, "func", task.fn)
+        key = hashlib.sha256(f"{fn.__module__}.{fn.__qualname__}".encode())
+        key.update(pickle.dumps(task.args))
+        for name in task.upstream:
+            key.update(digests[name].encode())
+        return key.hexdigest()
+
+    def _read_cache(self, key: str) -> tuple[Any, str] | None:
+        path = join(self.cache_dir, f"{key}.pickle")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # The modification time is the last use, for _prune
+        os.utime(path)
+        return pickle.loads(data), hashlib.sha256(data).hexdigest()
+
+    def _write_cache(self, key: str, output: Any) -> str:
+        data = pickle.dumps(output)
+        path = join(self.cache_dir, f"{key}.pickle")
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        return hashlib.sha256(data).hexdigest()
+
+    def _prune(self) -> None:
+        """Delete the least recently used outputs beyond `max_entries`."""
+        with os.scandir(self.cache_dir) as entries:
+            files = [entry for entry in entries if entry.name.endswith(".pickle")]
+        files.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in files[self.max_entries :]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,143 @@
+"""Layout of the s8 silver layer and the CO2 computation over it.
+
+    <local_dir>/silver/tracking/day=2023-11-01/*.parquet   one row per 5-second observation:
+                                                            icao, registration, type, timestamp, lat, lon, ...
+    <local_dir>/silver/aircraft/aircraft.parquet            one row per aircraft ordered by icao, enriched with
+                                                            registration, type, owner, manufacturer, model
+    <local_dir>/silver/aircraft/_page_index.json            first row of each row group of aircraft.parquet
+
+Fuel consumption rates come from `bdi_api.s8.reference`.
+"""
+
+import bisect
+import json
+import os
+from collections.abc import Iterator
+from datetime import date
+from itertools import accumulate
+from os.path import join
+
+import duckdb
+import pyarrow.parquet as pq
+
+from bdi_api.metrics import timed
+from bdi_api.s8.reference import fuel_rates
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+OBSERVATION_SECONDS = 5
+FUEL_KG_PER_GALLON = 3.04
+CO2_KG_PER_FUEL_KG = 3.15
+KG_PER_SHORT_TON = 907.185
+
+FETCH_SIZE = 1000
+
+AIRCRAFT_FIELDS = ["icao", "registration", "type", "owner", "manufacturer", "model"]
+AIRCRAFT_KEY = "silver/aircraft/aircraft.parquet"
+AIRCRAFT_PAGE_INDEX_KEY = "silver/aircraft/_page_index.json"
+
+# Observations per icao in one pass over the day.
+# Aircraft with several types in the day take the most observed one.
+OBSERVATIONS_SQL = """
+SELECT icao, mode(type) AS type, count(*) AS observation_count
+FROM read_parquet($files)
+WHERE $icaos IS NULL OR list_contains($icaos, icao)
+GROUP BY icao
+"""
+
+# The formula of get_aircraft_co2 applied to every aircraft at once
+CO2_SQL = f"""
+WITH observations AS ({OBSERVATIONS_SQL}), rates AS (
+    SELECT unnest($types::VARCHAR[]) AS type, unnest($galph::DOUBLE[]) AS galph
+)
+SELECT
+    icao,
+    observation_count * {OBSERVATION_SECONDS} / 3600 AS hours_flown,
+    hours_flown * galph * {FUEL_KG_PER_GALLON} * {CO2_KG_PER_FUEL_KG} / {KG_PER_SHORT_TON} AS co2
+FROM observations LEFT JOIN rates USING (type)
+ORDER BY icao
+"""
+
+_connection = duckdb.connect()
+
+
+def silver_dir() -> str:
+    return join(settings.local_dir, "silver")
+
+
+def tracking_files(day: date) -> list[str]:
+    """Parquet files of the day's observations, empty if the pipeline has not produced the day."""
+    directory = join(silver_dir(), "tracking", f"day={day.isoformat()}")
+    if not os.path.isdir(directory):
+        return []
+    return sorted(join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet"))
+
+
+def read_aircraft_page(num_results: int, page: int) -> list[dict]:
+    """Page `page` (0-indexed) of the aircraft table, reading only the row groups that cover it.
+
+    The page index gives the first row of every row group, so finding them is a binary
+    search. Opening the file still reads its footer, which checks the index is current.
+    """
+    path = join(settings.local_dir, AIRCRAFT_KEY)
+    try:
+        with open(join(settings.local_dir, AIRCRAFT_PAGE_INDEX_KEY)) as f:
+            page_index = json.load(f)
+        parquet = pq.ParquetFile(path)
+    except FileNotFoundError:
+        return []
+    with parquet:
+        offsets = page_index["row_group_offsets"]
+        if parquet.metadata.num_rows != page_index["rows"]:
+            # Caught between the writes of the table and of its index: use the footer
+            sizes = [parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)]
+            offsets = [0, *accumulate(sizes)][:-1]
+        start = page * num_results
+        if start >= parquet.metadata.num_rows:
+            return []
+        first = bisect.bisect_right(offsets, start) - 1
+        last = bisect.bisect_right(offsets, start + num_results - 1) - 1
+        table = parquet.read_row_groups(range(first, last + 1), columns=AIRCRAFT_FIELDS)
+    return table.slice(start - offsets[first], num_results).to_pylist()
+
+
+def hours_flown(observation_count: int) -> float:
+    return observation_count * OBSERVATION_SECONDS / 3600
+
+
+def co2_tons(hours: float, galph: float | None) -> float | None:
+    if galph is None:
+        return None
+    return hours * galph * FUEL_KG_PER_GALLON * CO2_KG_PER_FUEL_KG / KG_PER_SHORT_TON
+
+
+def iter_co2(day: date, icaos: list[str] | None = None) -> Iterator[dict]:
+    """`{"icao", "hours_flown", "co2"}` of every aircraft seen on `day` (or of `icaos` only), by icao.
+
+    Rows are fetched `FETCH_SIZE` at a time so a whole fleet is never held in memory.
+    """
+    rates = fuel_rates()
+    parameters = {"icaos": icaos, "types": list(rates), "galph": list(rates.values())}
+    for icao, hours, co2 in _fetch(CO2_SQL, day, parameters):
+        yield {"icao": icao, "hours_flown": hours, "co2": co2}
+
+
+def iter_observations(day: date) -> Iterator[dict]:
+    """`{"icao", "type", "observation_count"}` of every aircraft seen on `day`."""
+    for icao, aircraft_type, observation_count in _fetch(OBSERVATIONS_SQL, day, {"icaos": None}):
+        yield {"icao": icao, "type": aircraft_type, "observation_count": observation_count}
+
+
+def _fetch(sql: str, day: date, parameters: dict) -> Iterator[tuple]:
+    files = tracking_files(day)
+    if not files:
+        return
+    cursor = _connection.cursor()
+    try:
+        with timed("duckdb", "query"):
+            cursor.execute(sql, {"files": files, **parameters})
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            yield from rows
+    finally:
+        cursor.close()
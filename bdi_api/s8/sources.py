@@ -0,0 +1,94 @@
+"""Where the s8 pipeline reads from and writes to.
+
+The pipeline stages only see these two interfaces, so the same stages run against
+the real ADS-B Exchange site and S3 (in the Airflow DAG) or against local folders
+standing in for both (offline, with `python -m bdi_api.s8.pipeline --offline DIR`).
+"""
+
+import os
+from os.path import dirname, join
+from typing import Protocol
+
+import boto3
+import requests
+from botocore.exceptions import ClientError
+
+from bdi_api.metrics import instrument_boto3
+
+
+class HttpSource(Protocol):
+    def get(self, url: str) -> bytes: ...
+
+
+class ObjectStore(Protocol):
+    def put(self, key: str, data: bytes) -> None: ...
+
+    def get(self, key: str) -> bytes: ...
+
+    def exists(self, key: str) -> bool: ...
+
+
+class RemoteHttp:
+    def __init__(self, timeout: float = 30.0) -> None:
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def get(self, url: str) -> bytes:
+        response = self._session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+
+class LocalHttp:
+    """Serves `<base_url>/<path>` from `<root>/<path>`: a local mirror of the source site."""
+
+    def __init__(self, root: str, base_url: str) -> None:
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def get(self, url: str) -> bytes:
+        if not url.startswith(self.base_url + "/"):
+            raise ValueError(f"{url} is not under {self.base_url}")
+        with open(join(self.root, url[len(self.base_url) + 1 :]), "rb") as f:
+            return f.read()
+
+
+class S3Store:
+    def __init__(self, bucket: str) -> None:
+        self.bucket = bucket
+        self._client = instrument_boto3(boto3.client("s3"))
+
+    def put(self, key: str, data: bytes) -> None:
+        self._client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def get(self, key: str) -> bytes:
+        return self._client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+
+class LocalStore:
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def put(self, key: str, data: bytes) -> None:
+        path = join(self.root, key)
+        os.makedirs(dirname(path), exist_ok=True)
+        # Readers never see a half-written object
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def get(self, key: str) -> bytes:
+        with open(join(self.root, key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(join(self.root, key))
@@ -0,0 +1,114 @@
+"""In-process change feed of s9 runs and stages, served as server-sent events.
+
+Every status change is appended to a bounded buffer with an increasing id. A
+subscriber reads what follows the last id it saw, then sleeps until the next
+publish, so one connection replaces polling `/api/s9/pipelines`, and a client that
+reconnects with `Last-Event-ID` gets what it missed while it was away.
+"""
+
+import asyncio
+import json
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from fastapi import Request
+
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+KEEP_ALIVE_SECONDS = 15.0
+RETRY_MS = 3000
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    id: int
+    kind: str
+    repository: str
+    # Status of the run when the event was published
+    status: str
+    data: dict
+
+    def format(self) -> str:
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class ChangeFeed:
+    def __init__(self, size: int) -> None:
+        self._events: deque[ChangeEvent] = deque(maxlen=size)
+        self._last_id = 0
+        self._waiters: set[asyncio.Future] = set()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def publish(self, kind: str, repository: str, status: str, data: dict) -> ChangeEvent:
+        """Append an event and wake the subscribers. Call it from the event loop."""
+        self._last_id += 1
+        event = ChangeEvent(self._last_id, kind, repository, status, data)
+        self._events.append(event)
+        waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            if not waiter.done() and not waiter.get_loop().is_closed():
+                waiter.set_result(None)
+        return event
+
+    def since(self, last_id: int) -> list[ChangeEvent] | None:
+        """Events after `last_id`, or None if some of them already left the buffer.
+
+        An id past the newest event (e.g. from before a restart) is None too: waiting for it
+        would skip every event up to it.
+        """
+        if last_id > self._last_id:
+            return None
+        if last_id == self._last_id:
+            return []
+        if not self._events or self._events[0].id > last_id + 1:
+            return None
+        return [event for event in self._events if event.id > last_id]
+
+    async def wait(self, last_id: int, timeout: float) -> None:
+        """Return once there is an event after `last_id`, or after `timeout` seconds."""
+        if self._last_id > last_id:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+
+feed = ChangeFeed(settings.s9_event_buffer_size)
+
+
+async def stream(
+    request: Request, last_event_id: int | None, repository: str | None, status: str | None
+) -> AsyncIterator[str]:
+    """Server-sent events of `feed` matching the filters, from `last_event_id` or from now on.
+
+    If the client is too far behind to resume, it gets a `reset` event: reload the
+    runs with `GET /api/s9/pipelines`, then follow the events again.
+    """
+    last_id = feed.last_id if last_event_id is None else last_event_id
+    yield f"retry: {RETRY_MS}\n\n"
+    while not await request.is_disconnected():
+        events = feed.since(last_id)
+        if events is None:
+            last_id = feed.last_id
+            yield f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+            continue
+        for event in events:
+            last_id = event.id
+            if repository in (None, event.repository) and status in (None, event.status):
+                yield event.format()
+        if not events:
+            await feed.wait(last_id, KEEP_ALIVE_SECONDS)
+            if feed.last_id == last_id:
+                # A comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
@@ -1,7 +1,13 @@
-from datetime import datetime
+import os
+from typing import Annotated
 
-from fastapi import APIRouter, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from fastapi.params import Query
+from fastapi.responses import StreamingResponse
+
+from bdi_api.s9 import events, logs
+from bdi_api.s9.models import PipelineRun, PipelineStage, RunStatusUpdate, StageStatusUpdate
+from bdi_api.s9.store import get_store
 
 s9 = APIRouter(
     responses={
@@ -13,31 +19,12 @@ s9 = APIRouter(
 )
 
 
-class PipelineRun(BaseModel):
-    id: str
-    repository: str
-    branch: str
-    status: str
-    triggered_by: str
-    started_at: datetime
-    finished_at: datetime | None
-    stages: list[str]
-
-
-class PipelineStage(BaseModel):
-    name: str
-    status: str
-    started_at: datetime
-    finished_at: datetime | None
-    logs_url: str
-
-
 @s9.get("/pipelines")
 def list_pipelines(
     repository: str | None = None,
     status_filter: str | None = None,
-    num_results: int = 100,
-    page: int = 0,
+    num_results: Annotated[int, Query(ge=1, le=1000)] = 100,
+    page: Annotated[int, Query(ge=0)] = 0,
 ) -> list[PipelineRun]:
     """List CI/CD pipeline runs with their status.
 
@@ -47,13 +34,64 @@ def list_pipelines(
 
     Valid statuses: "success", "failure", "running", "pending"
     Valid triggered_by values: "push", "pull_request", "schedule", "manual"
+
+    Each filter combination has its own index already sorted by started_at,
+    so a page is a slice of it.
+    """
+    return get_store().page(repository, status_filter, page * num_results, num_results)
+
+
+@s9.get("/pipelines/events", response_class=StreamingResponse)
+async def pipeline_events(
+    request: Request,
+    repository: str | None = None,
+    status_filter: str | None = None,
+    last_event_id: Annotated[
+        int | None,
+        Header(description="Resume after this event id, sent back by EventSource when it reconnects"),
+    ] = None,
+) -> StreamingResponse:
+    """Server-sent events of run and stage status changes, to follow builds without polling.
+
+    Each event has an `id`, an `event` type (`run` or `stage`) and the run (plus the
+    stage for `stage` events) as JSON `data`. `repository` and `status_filter` match the
+    run, as in `GET /api/s9/pipelines`. With `Last-Event-ID`, the stream starts right
+    after that event; a `reset` event means it is too old and the runs must be reloaded.
     """
-    # TODO: Return pipeline runs from your data source
-    # TODO: Filter by repository if provided
-    # TODO: Filter by status if status_filter is provided
-    # TODO: Order by started_at descending
-    # TODO: Apply pagination
-    return []
+    return StreamingResponse(
+        events.stream(request, last_event_id, repository, status_filter),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@s9.patch("/pipelines/{pipeline_id}")
+async def update_pipeline(pipeline_id: str, update: RunStatusUpdate) -> PipelineRun:
+    """Set the status of a run and publish it to `GET /api/s9/pipelines/events`."""
+    run = get_store().update_run(pipeline_id, **update.model_dump(exclude_unset=True))
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Pipeline '{pipeline_id}' not found")
+    events.feed.publish("run", run.repository, run.status, {"run": run.model_dump(mode="json")})
+    return run
+
+
+@s9.patch("/pipelines/{pipeline_id}/stages/{stage}")
+async def update_pipeline_stage(pipeline_id: str, stage: str, update: StageStatusUpdate) -> PipelineStage:
+    """Set the status of a stage and publish it to `GET /api/s9/pipelines/events`."""
+    store = get_store()
+    updated = store.update_stage(pipeline_id, stage, **update.model_dump(exclude_unset=True))
+    if updated is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Stage '{stage}' of '{pipeline_id}' not found"
+        )
+    run = store.get(pipeline_id)
+    events.feed.publish(
+        "stage",
+        run.repository,
+        run.status,
+        {"run": run.model_dump(mode="json"), "stage": updated.model_dump(mode="json")},
+    )
+    return updated
 
 
 @s9.get("/pipelines/{pipeline_id}/stages")
@@ -65,7 +103,59 @@ def get_pipeline_stages(pipeline_id: str) -> list[PipelineStage]:
 
     Typical stages: "lint", "test", "build", "deploy"
     """
-    # TODO: Look up the pipeline run by pipeline_id
-    # TODO: Return the stages with their details
-    # TODO: Return 404 if pipeline_id not found
-    return []
+    stages = get_store().stages(pipeline_id)
+    if stages is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Pipeline '{pipeline_id}' not found")
+    return stages
+
+
+@s9.get("/pipelines/{pipeline_id}/stages/{stage}/logs", response_class=StreamingResponse)
+def get_stage_logs(
+    pipeline_id: str,
+    stage: str,
+    request: Request,
+    tail: Annotated[
+        int | None,
+        Query(description="Only send the last `tail` lines (the Range header is then ignored)", ge=1),
+    ] = None,
+) -> StreamingResponse:
+    """Stream the log of a stage, the `logs_url` of `PipelineStage`.
+
+    Supports a single HTTP `Range: bytes=...` (answered with `206`) to resume or page
+    through a log, and `tail=N` for its last lines. The file is read chunk by chunk
+    from the requested offset, never as a whole.
+    """
+    stages = get_store().stages(pipeline_id)
+    if stages is None or stage not in {s.name for s in stages}:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Stage '{stage}' of '{pipeline_id}' not found"
+        )
+    path = logs.log_path(pipeline_id, stage)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No logs for stage '{stage}' yet") from e
+    start, end, status_code = 0, size, status.HTTP_200_OK
+    headers = {"Accept-Ranges": "bytes"}
+    if tail is not None:
+        start = logs.tail_offset(path, tail)
+    elif "range" in request.headers:
+        try:
+            requested = logs.parse_range(request.headers["range"], size)
+        except logs.RangeNotSatisfiable as e:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail=str(e),
+                headers={"Content-Range": f"bytes */{size}"},
+            ) from e
+        if requested is not None:
+            start, end = requested
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        logs.iter_file(path, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type="text/plain; charset=utf-8",
+    )
@@ -0,0 +1,88 @@
+"""Stage logs on disk: `<local_dir>/s9_logs/<pipeline_id>/<stage>.log`.
+
+Logs are streamed in `CHUNK_SIZE` pieces from an offset, so serving a byte range or
+the last lines of a log of hundreds of MB only reads what is sent.
+"""
+
+import os
+import re
+from collections.abc import Iterator
+from os.path import join
+
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def log_path(pipeline_id: str, stage: str) -> str:
+    return join(settings.local_dir, "s9_logs", pipeline_id, f"{stage}.log")
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """`(start, end)` (end excluded) of a single `bytes=` range, None to send the whole file.
+
+    Multiple ranges and invalid ones (e.g. `bytes=30-10`) are answered with the whole file,
+    as RFC 9110 asks. Only a valid range starting past the end is not satisfiable.
+    """
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if first and last and int(last) < int(first):
+        return None
+    if not first:
+        # bytes=-N: the last N bytes
+        start, end = max(size - int(last), 0), size
+    else:
+        start, end = int(first), min(int(last) + 1, size) if last else size
+    if start >= size:
+        raise RangeNotSatisfiable(f"Range {header} is outside the {size} bytes of the log")
+    return start, end
+
+
+def tail_offset(path: str, lines: int) -> int:
+    """Offset of the start of the last `lines` lines, found by reading blocks backwards from the end."""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        if lines <= 0 or position == 0:
+            return position
+        f.seek(position - 1)
+        # A final newline ends the last line, it does not start a new one
+        newlines = -1 if f.read(1) == b"\n" else 0
+        while position > 0:
+            size = min(CHUNK_SIZE, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            found = block.count(b"\n")
+            if newlines + found < lines:
+                newlines += found
+                continue
+            # The line start is in this block: walk back over the newlines still needed
+            end = len(block)
+            for _ in range(lines - newlines):
+                end = block.rfind(b"\n", 0, end)
+            return position + end + 1
+        return 0
+
+
+def iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class PipelineRun(BaseModel):
+    id: str
+    repository: str
+    branch: str
+    status: str
+    triggered_by: str
+    started_at: datetime
+    finished_at: datetime | None
+    stages: list[str]
+
+
+class PipelineStage(BaseModel):
+    name: str
+    status: str
+    started_at: datetime
+    finished_at: datetime | None
+    logs_url: str
+
+
+class RunStatusUpdate(BaseModel):
+    status: Literal["success", "failure", "running", "pending"]
+    finished_at: datetime | None = None
+
+
+class StageStatusUpdate(BaseModel):
+    status: Literal["success", "failure", "running", "pending", "skipped"]
+    finished_at: datetime | None = None
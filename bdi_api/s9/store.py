@@ -0,0 +1,156 @@
+"""In-memory store of pipeline runs with sorted secondary indexes.
+
+Every index is a list of `(-started_at, id)` keys kept sorted on insert, so it is
+already in the `list_pipelines` order: a filtered page is a slice of the index
+matching the filters (all runs, repository, status or both) instead of a filter and
+a sort of every run. Stages are in a dict by run id.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+from collections.abc import Iterable
+from functools import lru_cache
+
+from bdi_api.s9.models import PipelineRun, PipelineStage
+from bdi_api.s9.synthetic import generate_runs
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+logger = logging.getLogger("uvicorn.error")
+
+_Key = tuple[float, str]
+
+
+class PipelineStore:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._runs: dict[str, PipelineRun] = {}
+        self._stages: dict[str, list[PipelineStage]] = {}
+        self._all: list[_Key] = []
+        self._by_repository: dict[str, list[_Key]] = {}
+        self._by_status: dict[str, list[_Key]] = {}
+        self._by_repository_status: dict[tuple[str, str], list[_Key]] = {}
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def add(self, run: PipelineRun, stages: list[PipelineStage]) -> None:
+        with self._lock:
+            if run.id in self._runs:
+                self._unindex(self._runs[run.id])
+            self._runs[run.id] = run
+            self._stages[run.id] = stages
+            for index in self._indexes(run):
+                bisect.insort(index, _key(run))
+
+    def add_many(self, runs: Iterable[tuple[PipelineRun, list[PipelineStage]]]) -> None:
+        """Bulk load: append everything, then sort each index once."""
+        with self._lock:
+            for run, stages in runs:
+                if run.id in self._runs:
+                    self._unindex(self._runs[run.id])
+                self._runs[run.id] = run
+                self._stages[run.id] = stages
+                for index in self._indexes(run):
+                    index.append(_key(run))
+            for index in self._all_indexes():
+                index.sort()
+
+    def update_run(self, run_id: str, **changes) -> PipelineRun | None:
+        """Replace fields of a run, moving it between indexes if its status changes."""
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return None
+            self._unindex(run)
+            run = self._runs[run_id] = run.model_copy(update=changes)
+            for index in self._indexes(run):
+                bisect.insort(index, _key(run))
+            return run
+
+    def update_stage(self, run_id: str, name: str, **changes) -> PipelineStage | None:
+        with self._lock:
+            stages = self._stages.get(run_id, [])
+            for position, stage in enumerate(stages):
+                if stage.name == name:
+                    stages[position] = stage.model_copy(update=changes)
+                    return stages[position]
+            return None
+
+    def get(self, run_id: str) -> PipelineRun | None:
+        return self._runs.get(run_id)
+
+    def stages(self, run_id: str) -> list[PipelineStage] | None:
+        return self._stages.get(run_id)
+
+    def page(self, repository: str | None, status: str | None, offset: int, limit: int) -> list[PipelineRun]:
+        """Runs matching the filters, most recent first, `offset` to `offset + limit`."""
+        with self._lock:
+            if repository is not None and status is not None:
+                index = self._by_repository_status.get((repository, status), [])
+            elif repository is not None:
+                index = self._by_repository.get(repository, [])
+            elif status is not None:
+                index = self._by_status.get(status, [])
+            else:
+                index = self._all
+            return [self._runs[run_id] for _, run_id in index[offset : offset + limit]]
+
+    def _indexes(self, run: PipelineRun) -> list[list[_Key]]:
+        return [
+            self._all,
+            self._by_repository.setdefault(run.repository, []),
+            self._by_status.setdefault(run.status, []),
+            self._by_repository_status.setdefault((run.repository, run.status), []),
+        ]
+
+    def _all_indexes(self) -> Iterable[list[_Key]]:
+        yield self._all
+        yield from self._by_repository.values()
+        yield from self._by_status.values()
+        yield from self._by_repository_status.values()
+
+    def _unindex(self, run: PipelineRun) -> None:
+        key = _key(run)
+        for index in self._indexes(run):
+            position = bisect.bisect_left(index, key)
+            if position < len(index) and index[position] == key:
+                del index[position]
+
+
+def _key(run: PipelineRun) -> _Key:
+    return -run.started_at.timestamp(), run.id
+
+
+def load_json(path: str) -> PipelineStore:
+    """Store of a JSON file holding `[{<PipelineRun fields>, "stages": [<PipelineStage>, ...]}, ...]`."""
+    with open(path) as f:
+        runs = json.load(f)
+    store = PipelineStore()
+    store.add_many(
+        (
+            PipelineRun(**{**run, "stages": [stage["name"] for stage in run["stages"]]}),
+            [PipelineStage(**stage) for stage in run["stages"]],
+        )
+        for run in runs
+    )
+    return store
+
+
+@lru_cache
+def get_store() -> PipelineStore:
+    """The runs of `<local_dir>/s9_pipelines.json`, or an empty store if it does not exist.
+
+    With `BDI_S9_SEED_RUNS` set, the empty store gets that many synthetic runs instead.
+    """
+    if os.path.exists(settings.s9_pipelines_file):
+        return load_json(settings.s9_pipelines_file)
+    store = PipelineStore()
+    if settings.s9_seed_runs > 0:
+        logger.warning("No %s: serving %d synthetic s9 runs", settings.s9_pipelines_file, settings.s9_seed_runs)
+        store.add_many(generate_runs(settings.s9_seed_runs))
+    return store
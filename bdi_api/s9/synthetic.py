@@ -0,0 +1,95 @@
+"""Deterministic synthetic pipeline runs, for demos, tests and benchmarks.
+
+python -m bdi_api.s9.synthetic --runs 1000000 --output data/s9_pipelines.json
+"""
+
+import argparse
+import json
+import random
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+from bdi_api.s9.models import PipelineRun, PipelineStage
+
+REPOSITORIES = [f"bdi/service-{i:02d}" for i in range(20)]
+BRANCHES = ["main", "develop", "release", "feature/api", "feature/ui", "fix/ci"]
+STAGES = ["lint", "test", "build", "deploy"]
+TRIGGERS = ["push", "pull_request", "schedule", "manual"]
+STATUSES = ["success", "failure", "running", "pending"]
+STATUS_WEIGHTS = [70, 15, 10, 5]
+
+END = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def generate_runs(count: int, seed: int = 0) -> Iterator[tuple[PipelineRun, list[PipelineStage]]]:
+    """`count` runs with their stages, one started every minute on average before 2026-01-01.
+
+    Built with `model_construct`: the values are valid by construction, and validating
+    millions of them would dominate the generation time.
+    """
+    rng = random.Random(seed)
+    started_at = END
+    for i in range(count):
+        started_at -= timedelta(seconds=rng.randint(1, 120))
+        run_id = f"run-{i:07d}"
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        names = STAGES if rng.random() < 0.7 else STAGES[:3]
+        stages = _stages(rng, run_id, names, status, started_at)
+        finished_at = stages[-1].finished_at if status in ("success", "failure") else None
+        run = PipelineRun.model_construct(
+            id=run_id,
+            repository=rng.choice(REPOSITORIES),
+            branch=rng.choice(BRANCHES),
+            status=status,
+            triggered_by=rng.choice(TRIGGERS),
+            started_at=started_at,
+            finished_at=finished_at,
+            stages=names,
+        )
+        yield run, stages
+
+
+def _stages(
+    rng: random.Random, run_id: str, names: list[str], status: str, started_at: datetime
+) -> list[PipelineStage]:
+    # Index of the stage the run stopped at: the failing or running one
+    current = {"success": len(names), "pending": 0}.get(status, rng.randrange(len(names)))
+    stages = []
+    at = started_at
+    for position, name in enumerate(names):
+        if position < current:
+            stage_status, duration = "success", timedelta(seconds=rng.randint(10, 600))
+        elif position == current and status in ("failure", "running"):
+            stage_status = status
+            duration = timedelta(seconds=rng.randint(10, 600)) if status == "failure" else None
+        else:
+            stage_status, duration = ("skipped" if status == "failure" else "pending"), None
+        stages.append(
+            PipelineStage.model_construct(
+                name=name,
+                status=stage_status,
+                started_at=at,
+                finished_at=at + duration if duration else None,
+                logs_url=f"/api/s9/pipelines/{run_id}/stages/{name}/logs",
+            )
+        )
+        at += duration or timedelta(0)
+    return stages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    with open(args.output, "w") as f:
+        f.write("[")
+        for i, (run, stages) in enumerate(generate_runs(args.runs, args.seed)):
+            document = {**run.model_dump(mode="json"), "stages": [stage.model_dump(mode="json") for stage in stages]}
+            f.write(("," if i else "") + json.dumps(document))
+        f.write("]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import codecs
+import json
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import Any
+
+from pydantic import BaseModel, ValidationError
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+# Where an array body is at: right after "[" (an element or "]" may follow), after a ","
+# (an element must follow), after an element ("," or "]" must follow) or after "]"
+_OPENED, _ELEMENT, _SEPARATOR, _CLOSED = "opened", "element", "separator", "closed"
+
+
+class MalformedBody(ValueError):
+    """The body is a JSON array that cannot be parsed any further."""
+
+
+async def iter_json_documents(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, Any, str | None]]:
+    """Parse a streamed request body holding either NDJSON or a single JSON array.
+
+    Yields `(index, document, error)` tuples without ever holding the whole body
+    in memory. An unparseable NDJSON line is yielded with its `error` so the
+    caller can report it and carry on. A broken array cannot be resynchronized,
+    so it raises `MalformedBody` instead.
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    is_array: bool | None = None
+    state = _OPENED
+    index = 0
+    async for chunk in chunks:
+        buffer += text.decode(chunk)
+        if is_array is None:
+            stripped = buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                continue
+            is_array = stripped[0] == "["
+            buffer = stripped[1:] if is_array else stripped
+        if is_array:
+            documents, buffer, state = _split_array(buffer, state, final=False)
+            parsed = [(document, None) for document in documents]
+        else:
+            *lines, buffer = buffer.split("\n")
+            parsed = [_parse_line(line) for line in lines if line.strip()]
+        for document, error in parsed:
+            yield index, document, error
+            index += 1
+    buffer += text.decode(b"", final=True)
+    if is_array:
+        documents, _, _ = _split_array(buffer, state, final=True)
+        for document in documents:
+            yield index, document, None
+            index += 1
+    elif buffer.strip():
+        yield index, *_parse_line(buffer)
+
+
+def _parse_line(line: str) -> tuple[Any, str | None]:
+    try:
+        return json.loads(line), None
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON: {e}"
+
+
+def _split_array(buffer: str, state: str, final: bool) -> tuple[list[Any], str, str]:
+    """Take every complete element off the front of an array body (opening `[` already consumed).
+
+    Returns the elements, the unparsed remainder and the state to resume from with the next chunk.
+    """
+    documents = []
+    position = 0
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position == len(buffer):
+            if final and state != _CLOSED:
+                raise MalformedBody("JSON array is not closed")
+            return documents, "", state
+        punctuation = _punctuation(buffer[position], state)
+        if punctuation is not None:
+            state = punctuation
+            position += 1
+            continue
+        start = position
+        try:
+            document, position = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if final:
+                raise MalformedBody(f"Invalid JSON array element: {e}") from e
+            return documents, buffer[start:], state
+        if position == len(buffer) and not final:
+            # A number or literal may continue in the next chunk
+            return documents, buffer[start:], state
+        documents.append(document)
+        state = _SEPARATOR
+
+
+def _punctuation(char: str, state: str) -> str | None:
+    """The state after `char` if it is an allowed "," or "]", None if an element starts there."""
+    if state == _CLOSED:
+        raise MalformedBody("Unexpected data after the JSON array")
+    if state == _SEPARATOR:
+        if char not in ",]":
+            raise MalformedBody(f"Expected ',' or ']' after a JSON array element, got {char!r}")
+        return _ELEMENT if char == "," else _CLOSED
+    if char == "]":
+        if state == _ELEMENT:
+            raise MalformedBody("Trailing ',' in the JSON array")
+        return _CLOSED
+    if char == ",":
+        raise MalformedBody("Missing JSON array element before ','")
+    return None
+
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    while position < len(buffer) and buffer[position] in _WHITESPACE:
+        position += 1
+    return position
+
+
+async def batched(items: AsyncIterable[Any], size: int) -> AsyncIterator[list[Any]]:
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validate_batch(
+    batch: list[tuple[int, Any, str | None]], model: type[BaseModel]
+) -> tuple[list[dict], list[int], list[dict]]:
+    """Validate parsed documents as `model`.
+
+    Returns the valid documents (dumped to dicts), their index in the body,
+    and `{"index", "error"}` entries for the others.
+    """
+    documents, indexes, errors = [], [], []
+    for index, document, error in batch:
+        if error is None:
+            try:
+                documents.append(model.model_validate(document).model_dump())
+                indexes.append(index)
+                continue
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'document'}: {err['msg']}" for err in e.errors())
+        errors.append({"index": index, "error": error})
+    return documents, indexes, errors
@@ -0,0 +1,106 @@
+"""A synthetic readsb-hist site: gzipped snapshots of the aircraft seen every 5 seconds.
+
+The files follow the layout and format of https://samples.adsbexchange.com/readsb-hist,
+so the s1, s4 and s8 downloads can be pointed at it with BDI_SOURCE_URL:
+
+    python -m benchmarks.readsb --aircraft 5000 --files 60 --port 8081
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os.path import join
+
+FILE_SECONDS = 5
+
+TYPES = ["A320", "A321", "B738", "B77W", "E190", "CRJ9", "C172", "XXXX"]
+
+
+def icao(index: int) -> str:
+    return f"{0xA00000 + index:06x}"
+
+
+def file_names(count: int) -> list[str]:
+    """The first `count` files of a day, as named on the site: 000000Z.json.gz, 000005Z.json.gz, ..."""
+    seconds = range(0, count * FILE_SECONDS, FILE_SECONDS)
+    return [f"{s // 3600:02d}{s // 60 % 60:02d}{s % 60:02d}Z.json.gz" for s in seconds]
+
+
+def write_day(root: str, day: date, files: int, aircraft: int, seed: int = 0) -> list[str]:
+    """Write the first `files` snapshots of `day` under `<root>/YYYY/MM/DD/`. Returns their paths."""
+    rng = random.Random(seed)
+    fleet = [(icao(i), f"N{i:05d}", rng.choice(TYPES)) for i in range(aircraft)]
+    directory = join(root, f"{day:%Y/%m/%d}")
+    os.makedirs(directory, exist_ok=True)
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+    paths = []
+    for number, name in enumerate(file_names(files)):
+        snapshot = {
+            "now": midnight + number * FILE_SECONDS,
+            "messages": rng.randrange(10**9),
+            "aircraft": [
+                {
+                    "hex": hex_,
+                    "r": registration,
+                    "t": type_,
+                    "lat": rng.uniform(-60, 70),
+                    "lon": rng.uniform(-180, 180),
+                    "alt_baro": "ground" if rng.random() < 0.1 else rng.randrange(0, 42000, 25),
+                    "gs": rng.uniform(0, 520),
+                    "seen": rng.uniform(0, 4),
+                    **({"emergency": "general"} if rng.random() < 0.001 else {}),
+                }
+                # About 80% of the fleet is in each snapshot
+                for hex_, registration, type_ in fleet
+                if rng.random() < 0.8
+            ],
+        }
+        path = join(directory, name)
+        with open(path, "wb") as f:
+            f.write(gzip.compress(json.dumps(snapshot).encode(), compresslevel=1))
+        paths.append(path)
+    return paths
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@contextmanager
+def serve(root: str, port: int = 0) -> Iterator[str]:
+    """Serve `root` over HTTP (with directory listings) in a thread. Yields the base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), partial(_QuietHandler, directory=root))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="data/readsb-hist")
+    parser.add_argument("--day", type=date.fromisoformat, default=date(2023, 11, 1))
+    parser.add_argument("--files", type=int, default=60)
+    parser.add_argument("--aircraft", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    write_day(args.root, args.day, args.files, args.aircraft)
+    with serve(args.root, args.port) as url:
+        print(f"Serving {args.root} at {url}, use BDI_SOURCE_URL={url}")
+        threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
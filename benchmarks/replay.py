@@ -0,0 +1,236 @@
+"""Replay requests recorded by `bdi_api.recorder` (BDI_RECORD_REQUESTS=true) against the API.
+
+Closed loop: `--concurrency` clients each send the next request as soon as their previous
+one is answered, measuring how much the API can take. Open loop: requests are sent at the
+recorded arrival times divided by `--speedup` (or at a Poisson `--rate` per second)
+whatever the API answers, measuring the latency real traffic would see.
+
+Without `--base-url`, a local `uvicorn bdi_api.app:app` is started for the run:
+
+    python -m benchmarks.replay data/requests.jsonl --mode open --speedup 10
+    python -m benchmarks.replay data/requests.jsonl --mode closed --concurrency 50 --loops 3
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import httpx
+
+from benchmarks.suite import summarize
+
+# Upper bounds of the latency histogram buckets, in ms
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+
+
+def load(path: str, limit: int | None = None) -> list[dict]:
+    """The recorded requests, in arrival order."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit]
+
+
+def to_request(record: dict) -> dict:
+    """The arguments of `httpx.AsyncClient.request` replaying `record`."""
+    call = {"method": record["method"], "url": record["path"] + ("?" + record["query"] if record["query"] else "")}
+    if "body" in record:
+        call["content"] = record["body"].encode()
+    elif "body_base64" in record:
+        call["content"] = base64.b64decode(record["body_base64"])
+    if record.get("content_type"):
+        call["headers"] = {"content-type": record["content_type"]}
+    return call
+
+
+class Results:
+    def __init__(self) -> None:
+        self.timings: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        # How late open-loop requests were sent compared to their schedule
+        self.lag: list[float] = []
+
+    def add(self, record: dict, seconds: float, error: bool) -> None:
+        key = f"{record['method']} {record.get('route') or record['path']}"
+        self.timings.setdefault(key, []).append(seconds)
+        self.errors[key] = self.errors.get(key, 0) + error
+
+    def report(self, elapsed: float) -> dict:
+        every = [t for timings in self.timings.values() for t in timings]
+        errors = sum(self.errors.values())
+        return {
+            # A route only appears once it has a timing; the total is empty for an empty recording
+            "total": {**summarize(every, errors, elapsed), "error_rate": errors / len(every) if every else 0.0},
+            "histogram_ms": histogram(every),
+            "routes": {
+                key: {**summarize(timings, self.errors[key], elapsed), "error_rate": self.errors[key] / len(timings)}
+                for key, timings in sorted(self.timings.items())
+            },
+            "max_lag_ms": max(self.lag, default=0.0) * 1000,
+        }
+
+
+def histogram(timings: list[float]) -> dict[str, int]:
+    counts = [0] * len(BUCKETS_MS)
+    for seconds in timings:
+        counts[bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+    return {f"<={bound:g}": count for bound, count in zip(BUCKETS_MS, counts, strict=True)}
+
+
+async def _send(client: httpx.AsyncClient, record: dict, results: Results) -> None:
+    start = time.perf_counter()
+    try:
+        response = await client.request(**to_request(record))
+        await response.aread()
+        error = response.status_code >= 500
+    except httpx.HTTPError:
+        error = True
+    results.add(record, time.perf_counter() - start, error)
+
+
+async def closed_loop(client: httpx.AsyncClient, records: list[dict], concurrency: int) -> Results:
+    results = Results()
+    queue = iter(records)
+
+    async def worker() -> None:
+        for record in queue:
+            await _send(client, record, results)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def open_loop(
+    client: httpx.AsyncClient,
+    records: list[dict],
+    speedup: float = 1.0,
+    rate: float | None = None,
+    max_in_flight: int = 1000,
+) -> Results:
+    """Send each record at its (sped up) recorded offset, or at Poisson arrivals of `rate` per second.
+
+    `max_in_flight` only protects the load generator: past it, sends wait and the lag grows.
+    """
+    results = Results()
+    rng = random.Random(0)
+    offsets, offset = [], 0.0
+    for record in records:
+        if rate is None:
+            offset = (record["ts"] - records[0]["ts"]) / speedup
+        else:
+            offset += rng.expovariate(rate)
+        offsets.append(offset)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    tasks = []
+    start = time.perf_counter()
+
+    async def send(record: dict, scheduled: float) -> None:
+        async with semaphore:
+            results.lag.append(time.perf_counter() - start - scheduled)
+            await _send(client, record, results)
+
+    for record, scheduled in zip(records, offsets, strict=True):
+        delay = scheduled - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(record, scheduled)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+@contextmanager
+def local_app() -> Iterator[str]:
+    """Start `uvicorn bdi_api.app:app` on a free port, yield its URL once it answers `/health`."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bdi_api.app:app", "--port", str(port), "--log-level", "warning"]
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("The local app did not start")
+        yield url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def run(args: argparse.Namespace, base_url: str) -> dict:
+    records = load(args.file, args.limit) * args.loops
+    if args.loops > 1 and args.mode == "open" and args.rate is None:
+        raise SystemExit("--loops needs --mode closed or a --rate: recorded times cannot be repeated")
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        if args.mode == "closed":
+            results = await closed_loop(client, records, args.concurrency)
+        else:
+            results = await open_loop(client, records, args.speedup, args.rate, args.concurrency)
+        return results.report(time.perf_counter() - start)
+
+
+def print_report(report: dict) -> None:
+    total = report["total"]
+    if not total["requests"]:
+        print("no requests: the recording is empty")
+        return
+    print(
+        f"{total['requests']} requests, {total['throughput']:.1f} req/s, error rate {total['error_rate']:.2%}, "
+        f"max send lag {report['max_lag_ms']:.1f} ms"
+    )
+    width = max(report["histogram_ms"].values(), default=0) or 1
+    for bucket, count in report["histogram_ms"].items():
+        print(f"{bucket:>8} ms {count:>8} {'#' * round(40 * count / width)}")
+    print(f"\n{'route':<55} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, r in report["routes"].items():
+        print(
+            f"{route:<55} {r['requests']:>7} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+            f"{r['error_rate']:>7.1%}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="JSONL written by BDI_RECORD_REQUESTS")
+    parser.add_argument("--base-url", help="API to replay against. A local app is started if omitted")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--concurrency", type=int, default=20, help="Closed loop: clients. Open loop: max in flight")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Open loop: divide the recorded gaps by this")
+    parser.add_argument("--rate", type=float, help="Open loop: Poisson arrivals per second instead of recorded times")
+    parser.add_argument("--limit", type=int, help="Only the first N recorded requests")
+    parser.add_argument("--loops", type=int, default=1, help="Replay the recording this many times")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Also write the report as JSON here")
+    args = parser.parse_args()
+
+    if args.base_url:
+        report = asyncio.run(run(args, args.base_url))
+    else:
+        with local_app() as url:
+            report = asyncio.run(run(args, url))
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Load benchmark for the s6 MongoDB access: shared async pool vs. one client per request.
+
+Both variants serve `GET /api/s6/aircraft/{icao}` through the ASGI stack in-process,
+against the MongoDB at BDI_MONGO_URL (start one with `make mongo`):
+
+    python -m benchmarks.s6_mongo_pool --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+import httpx
+from fastapi import FastAPI
+from pymongo import DESCENDING, MongoClient
+
+from bdi_api.app import app
+from bdi_api.s6.mongo import DATABASE, POSITIONS
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+POSITION = {
+    "icao": "bench0",
+    "registration": "EC-BCH",
+    "type": "A320",
+    "lat": 41.29,
+    "lon": 2.07,
+    "timestamp": "2026-02-19T10:30:00Z",
+}
+
+per_request_app = FastAPI()
+
+
+@per_request_app.get("/api/s6/aircraft/{icao}")
+def get_aircraft_with_own_client(icao: str) -> dict:
+    """What the original TODOs suggested: a new MongoClient (handshake, discovery, pool) per call."""
+    with MongoClient(settings.mongo_url) as client:
+        return client[DATABASE][POSITIONS].find_one({"icao": icao}, {"_id": 0}, sort=[("timestamp", DESCENDING)])
+
+
+async def _load(call: Callable[[], Awaitable[httpx.Response]], requests: int, concurrency: int) -> dict:
+    timings = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call()
+            timings.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    cuts = statistics.quantiles(timings, n=100)
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+async def run(requests: int, concurrency: int) -> dict[str, dict]:
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            (await client.post("/api/s6/aircraft", json=POSITION)).raise_for_status()
+            path = f"/api/s6/aircraft/{POSITION['icao']}"
+            results["shared async pool"] = await _load(lambda: client.get(path), requests, concurrency)
+            transport = httpx.ASGITransport(app=per_request_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as baseline:
+                results["client per request"] = await _load(lambda: baseline.get(path), requests, concurrency)
+            await client.delete(path)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.requests, args.concurrency))
+    print(f"{'variant':<20} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for variant, r in results.items():
+        print(f"{variant:<20} {r['throughput']:>10.1f} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} {r['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Friend recommendation latency against graph size, per s7 backend.
+
+Builds random FRIENDS_WITH graphs (each person gets `--degree` random friends) and times
+`recommendations` for a sample of persons. The in-memory CSR backend always runs; add
+`--neo4j` to load the same graphs into the Neo4J at BDI_NEO4J_URL (start one with
+`make neo4j`, its Person nodes are replaced):
+
+    python -m benchmarks.s7_graph --sizes 1000 10000 100000 --degree 10 --neo4j
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from bdi_api.s7 import graph
+from bdi_api.s7.backends import GraphBackend, Neo4jGraph
+from bdi_api.s7.graph import FRIENDS_WITH
+from bdi_api.s7.memory import MemoryGraph
+
+BATCH_SIZE = 5000
+
+
+def random_graph(size: int, degree: int, seed: int = 42) -> tuple[list[dict], list[dict]]:
+    rng = random.Random(seed)
+    cities = ["Barcelona", "Madrid", "Girona"]
+    persons = [{"name": f"person{i:07d}", "city": rng.choice(cities), "age": 30} for i in range(size)]
+    relationships = [
+        {"from_person": persons[i]["name"], "to_person": persons[rng.randrange(size)]["name"], "index": i * degree + j}
+        for i in range(size)
+        for j in range(degree)
+    ]
+    return persons, relationships
+
+
+def load(backend: GraphBackend, persons: list[dict], relationships: list[dict]) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(persons), BATCH_SIZE):
+        backend.merge_persons(persons[i : i + BATCH_SIZE])
+    for i in range(0, len(relationships), BATCH_SIZE):
+        backend.merge_relationships(FRIENDS_WITH, relationships[i : i + BATCH_SIZE])
+    return time.perf_counter() - start
+
+
+def time_recommendations(backend: GraphBackend, names: list[str]) -> dict:
+    backend.recommendations(names[0])  # warm-up, builds the CSR arrays of the memory backend
+    timings = []
+    for name in names:
+        start = time.perf_counter()
+        backend.recommendations(name)
+        timings.append(time.perf_counter() - start)
+    cuts = statistics.quantiles(timings, n=100)
+    return {"p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--degree", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--neo4j", action="store_true", help="Also benchmark the Neo4J backend")
+    args = parser.parse_args()
+
+    if args.neo4j:
+        graph.open_driver()
+    print(f"{'backend':<8} {'persons':>9} {'edges':>9} {'load s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for size in args.sizes:
+        persons, relationships = random_graph(size, args.degree)
+        names = [person["name"] for person in random.Random(size).choices(persons, k=args.samples)]
+        backends: dict[str, GraphBackend] = {"memory": MemoryGraph()}
+        if args.neo4j:
+            with graph.get_driver().session() as session:
+                # Auto-commit: CALL ... IN TRANSACTIONS cannot run in a managed transaction
+                session.run("MATCH (p:Person) CALL { WITH p DETACH DELETE p } IN TRANSACTIONS").consume()
+            backends["neo4j"] = Neo4jGraph()
+        for name, backend in backends.items():
+            load_seconds = load(backend, persons, relationships)
+            r = time_recommendations(backend, names)
+            print(
+                f"{name:<8} {size:>9} {len(relationships):>9} {load_seconds:>9.2f} "
+                f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f}"
+            )
+    graph.close_driver()
+
+
+if __name__ == "__main__":
+    main()
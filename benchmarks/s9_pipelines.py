@@ -0,0 +1,70 @@
+"""Latency of `list_pipelines` pages: indexed store vs. filtering and sorting every run.
+
+python -m benchmarks.s9_pipelines --runs 1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+from collections.abc import Callable
+
+from bdi_api.s9.models import PipelineRun
+from bdi_api.s9.store import PipelineStore
+from bdi_api.s9.synthetic import REPOSITORIES, STATUSES, generate_runs
+
+PAGE_SIZE = 100
+
+
+def naive_page(runs: list[PipelineRun], repository: str | None, status: str | None, page: int) -> list[PipelineRun]:
+    matching = [
+        run
+        for run in runs
+        if (repository is None or run.repository == repository) and (status is None or run.status == status)
+    ]
+    matching.sort(key=lambda run: run.started_at, reverse=True)
+    return matching[page * PAGE_SIZE : (page + 1) * PAGE_SIZE]
+
+
+def _time(query: Callable[[str | None, str | None, int], list], queries: list[tuple]) -> dict:
+    timings = []
+    for repository, status, page in queries:
+        start = time.perf_counter()
+        query(repository, status, page)
+        timings.append(time.perf_counter() - start)
+    cuts = statistics.quantiles(timings, n=100)
+    return {"p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--naive-queries", type=int, default=20, help="The baseline is slow: fewer samples")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    runs = list(generate_runs(args.runs))
+    print(f"Generated {args.runs} runs in {time.perf_counter() - start:.1f}s")
+    store = PipelineStore()
+    start = time.perf_counter()
+    store.add_many(runs)
+    print(f"Indexed them in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(0)
+    queries = [
+        (rng.choice([None, *REPOSITORIES]), rng.choice([None, *STATUSES]), rng.randrange(20))
+        for _ in range(args.queries)
+    ]
+    only_runs = [run for run, _ in runs]
+    results = {
+        "indexed store": _time(lambda r, s, p: store.page(r, s, p * PAGE_SIZE, PAGE_SIZE), queries),
+        "filter + sort": _time(lambda r, s, p: naive_page(only_runs, r, s, p), queries[: args.naive_queries]),
+    }
+    print(f"{'variant':<15} {'p50 ms':>10} {'p95 ms':>10}")
+    for variant, r in results.items():
+        print(f"{variant:<15} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
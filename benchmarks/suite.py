@@ -0,0 +1,438 @@
+"""Throughput and latency of every router at several data scales, compared with a baseline.
+
+Each scale runs in a fresh process whose app only talks to local stand-ins:
+
+* a synthetic readsb-hist site over HTTP (`benchmarks.readsb`), downloaded by the s8
+  pipeline into a temporary BDI_LOCAL_DIR,
+* moto for S3, SQLite for BDI_DB_URL, the in-memory s7 graph backend,
+* the MongoDB at BDI_MONGO_URL if one answers (s6 is skipped otherwise).
+
+`scale` is the number of aircraft, employees, persons and pipeline runs generated.
+
+    python -m benchmarks.suite --scales 1000,10000 --output benchmarks/results.json
+    python -m benchmarks.suite --update-baseline      # store the results as the new baseline
+
+The run fails (exit code 1) when an endpoint's p95 latency or throughput drifts beyond
+the thresholds from `benchmarks/baseline.json`. Refresh the baseline on the machine
+that runs the comparison: numbers from another machine mean nothing.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from multiprocessing import get_context
+from os.path import dirname, join
+
+import httpx
+
+ROUTERS = ["s1", "s4", "s5", "s6", "s7", "s8", "s9"]
+DAY = date(2023, 11, 1)
+BASELINE = join(dirname(__file__), "baseline.json")
+
+
+@dataclass
+class Endpoint:
+    router: str
+    # Route template, the key of the results
+    name: str
+    # Builds the arguments of `httpx.AsyncClient.request` for one call
+    request: Callable[[random.Random], dict]
+
+
+def summarize(timings: list[float], errors: int, elapsed: float) -> dict:
+    """Count, throughput and percentiles of `timings` (seconds). All zeros if there are none."""
+    cuts = statistics.quantiles(timings, n=100) if len(timings) > 1 else (timings or [0.0]) * 99
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "throughput": len(timings) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+async def measure(
+    client: httpx.AsyncClient, endpoint: Endpoint, requests: int, concurrency: int, warmup: int = 5
+) -> dict:
+    """Send `requests` calls, at most `concurrency` at a time. 5xx answers and exceptions are errors.
+
+    The first `warmup` calls are sent one by one and not measured: they pay for lazy
+    loading (stores, caches, connections) that steady traffic does not see.
+    """
+    rng = random.Random(0)
+    for _ in range(warmup):
+        await client.request(**endpoint.request(rng))
+    calls = [endpoint.request(rng) for _ in range(requests)]
+    timings: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(call: dict) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(**call)
+                await response.aread()
+                errors += response.status_code >= 500
+            except Exception:
+                errors += 1
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(call) for call in calls))
+    return summarize(timings, errors, time.perf_counter() - start)
+
+
+def mongo_available(url: str) -> bool:
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    try:
+        with MongoClient(url, serverSelectionTimeoutMS=500) as client:
+            client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+def _ndjson(rows: list[dict]) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def seed_s5(db_url: str, scale: int) -> None:
+    """An HR schema with `scale` employees, as the s5 exercise builds it."""
+    from sqlalchemy import create_engine, text
+
+    rng = random.Random(0)
+    engine = create_engine(db_url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE department (id INTEGER PRIMARY KEY, name TEXT NOT NULL)"))
+        conn.execute(
+            text(
+                "CREATE TABLE employee (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, email TEXT, "
+                "salary NUMERIC, department_id INTEGER REFERENCES department(id), hire_date TEXT)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE salary_history (id INTEGER PRIMARY KEY, employee_id INTEGER REFERENCES employee(id), "
+                "old_salary NUMERIC, new_salary NUMERIC, change_date TEXT)"
+            )
+        )
+        conn.execute(
+            text("INSERT INTO department VALUES (:id, :name)"), [{"id": i, "name": f"Dept {i}"} for i in range(1, 21)]
+        )
+        employees, changes = [], []
+        for i in range(1, scale + 1):
+            salary = rng.randrange(30_000, 120_000)
+            employees.append(
+                {"id": i, "first": f"F{i}", "last": f"L{i}", "email": f"e{i}@bdi.test", "salary": salary}
+                | {"department": rng.randrange(1, 21), "hired": f"20{rng.randrange(10, 21)}-01-01"}
+            )
+            for year in (2021, 2022, 2023):
+                new_salary = salary + rng.randrange(0, 5000)
+                changes.append(
+                    {"employee": i, "old": salary, "new": new_salary, "day": f"{year}-0{rng.randrange(1, 10)}-01"}
+                )
+                salary = new_salary
+        conn.execute(
+            text("INSERT INTO employee VALUES (:id, :first, :last, :email, :salary, :department, :hired)"), employees
+        )
+        conn.execute(
+            text(
+                "INSERT INTO salary_history (employee_id, old_salary, new_salary, change_date) "
+                "VALUES (:employee, :old, :new, :day)"
+            ),
+            changes,
+        )
+    engine.dispose()
+
+
+def seed_s8(local_dir: str, files: int, scale: int) -> None:
+    """Run the s8 pipeline over HTTP against the synthetic site: silver, aircraft table and gold."""
+    from bdi_api.s8.pipeline import build_tasks
+    from bdi_api.s8.runner import Runner
+    from bdi_api.s8.sources import LocalStore, RemoteHttp
+    from benchmarks.readsb import TYPES, icao
+
+    with open(join(local_dir, "aircraft_type_fuel_consumption_rates.json"), "w") as f:
+        json.dump({type_: {"galph": 100 + 50 * i} for i, type_ in enumerate(TYPES[:-1])}, f)
+    with open(join(local_dir, "aircraft_database.csv"), "w") as f:
+        f.write("icao,registration,type,owner,manufacturer,model\n")
+        f.writelines(f"{icao(i)},N{i:05d},A320,Owner {i % 97},Airbus,A320-214\n" for i in range(0, scale, 3))
+    Runner(join(local_dir, "pipeline-cache"), io_workers=8, cpu_workers=2).run(
+        build_tasks(DAY, files, RemoteHttp(), LocalStore(local_dir))
+    )
+
+
+def endpoints(scale: int, files: int) -> list[Endpoint]:
+    from benchmarks.readsb import icao
+
+    def get(url: Callable[[random.Random], str]) -> Callable[[random.Random], dict]:
+        return lambda rng: {"method": "GET", "url": url(rng)}
+
+    def run_id(rng: random.Random) -> str:
+        return f"run-{rng.randrange(scale):07d}"
+
+    pages = max(1, scale // 100)
+    as_of = "2022-06-15"
+    return [
+        Endpoint(
+            "s1",
+            "POST /api/s1/aircraft/download",
+            lambda rng: {"method": "POST", "url": "/api/s1/aircraft/download", "params": {"file_limit": files}},
+        ),
+        Endpoint("s1", "GET /api/s1/aircraft/", get(lambda rng: f"/api/s1/aircraft/?page={rng.randrange(pages)}")),
+        Endpoint(
+            "s1",
+            "GET /api/s1/aircraft/{icao}/positions",
+            get(lambda rng: f"/api/s1/aircraft/{icao(rng.randrange(scale))}/positions"),
+        ),
+        Endpoint(
+            "s1",
+            "GET /api/s1/aircraft/{icao}/stats",
+            get(lambda rng: f"/api/s1/aircraft/{icao(rng.randrange(scale))}/stats"),
+        ),
+        Endpoint(
+            "s4",
+            "POST /api/s4/aircraft/download",
+            lambda rng: {"method": "POST", "url": "/api/s4/aircraft/download", "params": {"file_limit": files}},
+        ),
+        Endpoint(
+            "s4", "POST /api/s4/aircraft/prepare", lambda rng: {"method": "POST", "url": "/api/s4/aircraft/prepare"}
+        ),
+        Endpoint(
+            "s5", "GET /api/s5/employees/", get(lambda rng: f"/api/s5/employees/?page={rng.randrange(1, pages + 1)}")
+        ),
+        Endpoint(
+            "s5",
+            "GET /api/s5/employees/{emp_id}/salary-history",
+            get(lambda rng: f"/api/s5/employees/{rng.randrange(1, scale + 1)}/salary-history"),
+        ),
+        Endpoint("s5", "GET /api/s5/salaries/as-of", get(lambda rng: f"/api/s5/salaries/as-of?as_of={as_of}")),
+        Endpoint(
+            "s5",
+            "GET /api/s5/departments/payroll/as-of",
+            get(lambda rng: f"/api/s5/departments/payroll/as-of?as_of={as_of}"),
+        ),
+        Endpoint(
+            "s6", "GET /api/s6/aircraft/{icao}", get(lambda rng: f"/api/s6/aircraft/{icao(rng.randrange(scale))}")
+        ),
+        Endpoint(
+            "s6", "GET /api/s6/aircraft/", get(lambda rng: f"/api/s6/aircraft/?page={rng.randrange(1, pages + 1)}")
+        ),
+        Endpoint("s6", "GET /api/s6/aircraft/stats", get(lambda rng: "/api/s6/aircraft/stats")),
+        Endpoint(
+            "s7",
+            "GET /api/s7/graph/persons",
+            get(lambda rng: f"/api/s7/graph/persons?after=p{rng.randrange(scale):07d}"),
+        ),
+        Endpoint(
+            "s7",
+            "GET /api/s7/graph/person/{name}/friends",
+            get(lambda rng: f"/api/s7/graph/person/p{rng.randrange(scale):07d}/friends"),
+        ),
+        Endpoint(
+            "s7",
+            "GET /api/s7/graph/person/{name}/recommendations",
+            get(lambda rng: f"/api/s7/graph/person/p{rng.randrange(scale):07d}/recommendations"),
+        ),
+        Endpoint("s8", "GET /api/s8/aircraft/", get(lambda rng: f"/api/s8/aircraft/?page={rng.randrange(pages)}")),
+        Endpoint(
+            "s8",
+            "GET /api/s8/aircraft/{icao}/co2",
+            get(lambda rng: f"/api/s8/aircraft/{icao(rng.randrange(scale))}/co2?day={DAY}"),
+        ),
+        Endpoint(
+            "s8",
+            "GET /api/s8/aircraft/co2",
+            get(lambda rng: f"/api/s8/aircraft/co2?day={DAY}&icao={icao(rng.randrange(scale))}"),
+        ),
+        Endpoint("s9", "GET /api/s9/pipelines", get(lambda rng: f"/api/s9/pipelines?page={rng.randrange(pages)}")),
+        Endpoint(
+            "s9",
+            "GET /api/s9/pipelines?status_filter",
+            get(lambda rng: f"/api/s9/pipelines?status_filter={rng.choice(['success', 'failure', 'running'])}"),
+        ),
+        Endpoint(
+            "s9",
+            "GET /api/s9/pipelines/{pipeline_id}/stages",
+            get(lambda rng: f"/api/s9/pipelines/{run_id(rng)}/stages"),
+        ),
+    ]
+
+
+async def _run(scale: int, routers: list[str], files: int, requests: int, concurrency: int) -> dict:
+    from bdi_api.app import app
+    from benchmarks.readsb import icao
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60
+        ) as client:
+            if "s7" in routers:
+                rng = random.Random(0)
+                persons = [{"name": f"p{i:07d}", "city": f"City {i % 50}", "age": 18 + i % 60} for i in range(scale)]
+                friendships = [
+                    {"from_person": f"p{rng.randrange(scale):07d}", "to_person": f"p{rng.randrange(scale):07d}"}
+                    for _ in range(scale * 5)
+                ]
+                (await client.post("/api/s7/graph/persons/bulk", content=_ndjson(persons))).raise_for_status()
+                (await client.post("/api/s7/graph/relationships/bulk", content=_ndjson(friendships))).raise_for_status()
+            if "s6" in routers:
+                positions = [
+                    {
+                        "icao": icao(i % scale),
+                        "type": "A320",
+                        "lat": 41.3,
+                        "lon": 2.1,
+                        "timestamp": f"2023-11-01T00:00:{i % 60:02d}Z",
+                    }
+                    for i in range(scale * 3)
+                ]
+                (await client.post("/api/s6/aircraft/bulk", content=_ndjson(positions))).raise_for_status()
+            results = {}
+            for endpoint in endpoints(scale, files):
+                if endpoint.router in routers:
+                    results[endpoint.name] = await measure(client, endpoint, requests, concurrency)
+            if "s6" in routers:
+                for i in range(scale):
+                    await client.delete(f"/api/s6/aircraft/{icao(i)}", params={"mode": "sync"})
+    return results
+
+
+def run_scale(scale: int, routers: list[str], files: int, requests: int, concurrency: int) -> dict:
+    """Benchmark one scale. Runs in its own process: the app reads its settings on import."""
+    from moto import mock_s3
+
+    from benchmarks.readsb import serve, write_day
+
+    with tempfile.TemporaryDirectory(prefix="bdi-bench-") as local_dir, mock_s3():
+        write_day(join(local_dir, "readsb-hist"), DAY, files, scale)
+        with serve(join(local_dir, "readsb-hist")) as source_url:
+            os.environ.update(
+                {
+                    "BDI_LOCAL_DIR": local_dir,
+                    "BDI_SOURCE_URL": source_url,
+                    "BDI_DB_URL": f"sqlite:///{join(local_dir, 'bench.db')}",
+                    "BDI_S3_BUCKET": "bdi-bench",
+                    "BDI_S7_GRAPH_BACKEND": "memory",
+                    "BDI_S9_SEED_RUNS": str(scale),
+                    "AWS_ACCESS_KEY_ID": "bench",
+                    "AWS_SECRET_ACCESS_KEY": "bench",
+                    "AWS_DEFAULT_REGION": "us-east-1",
+                }
+            )
+            import boto3
+
+            boto3.client("s3").create_bucket(Bucket="bdi-bench")
+            if "s6" in routers and not mongo_available(os.environ.get("BDI_MONGO_URL", "mongodb://localhost:27017")):
+                print("No MongoDB at BDI_MONGO_URL: skipping s6", file=sys.stderr)
+                routers = [router for router in routers if router != "s6"]
+            if "s5" in routers:
+                seed_s5(os.environ["BDI_DB_URL"], scale)
+            if "s8" in routers:
+                seed_s8(local_dir, files, scale)
+            return asyncio.run(_run(scale, routers, files, requests, concurrency))
+
+
+def compare(
+    results: dict, baseline: dict, latency_threshold: float, throughput_threshold: float, min_ms: float
+) -> list[str]:
+    """Regressions of `results` against `baseline`, as readable lines."""
+    regressions = []
+    for scale, measured in results["scales"].items():
+        for name, current in measured.items():
+            previous = baseline["scales"].get(scale, {}).get(name)
+            if previous is None:
+                continue
+            # Sub-millisecond latencies are mostly noise: allow `min_ms` on top of the relative threshold
+            allowed_ms = max(previous["p95_ms"] * (1 + latency_threshold), previous["p95_ms"] + min_ms)
+            if current["p95_ms"] > allowed_ms:
+                regressions.append(f"{scale} {name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+            if current["throughput"] < previous["throughput"] * (1 - throughput_threshold):
+                regressions.append(
+                    f"{scale} {name}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f} req/s"
+                )
+            if current["errors"] > previous["errors"]:
+                regressions.append(f"{scale} {name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1000,10000", help="Comma-separated data sizes")
+    parser.add_argument("--routers", default=",".join(ROUTERS))
+    parser.add_argument("--files", type=int, default=12, help="readsb-hist files of the day (5 s each)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to --baseline")
+    parser.add_argument("--latency-threshold", type=float, default=0.25, help="Allowed relative p95 increase")
+    parser.add_argument("--throughput-threshold", type=float, default=0.20, help="Allowed relative throughput drop")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="p95 increase always allowed, in ms")
+    args = parser.parse_args()
+    routers = args.routers.split(",")
+
+    results: dict = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "files": args.files,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scales": {},
+    }
+    for scale in args.scales.split(","):
+        # A fresh interpreter per scale, so the settings and module-level state start over
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            measured = pool.submit(run_scale, int(scale), routers, args.files, args.requests, args.concurrency).result()
+        results["scales"][scale] = measured
+        print(f"\nscale {scale}")
+        print(f"{'endpoint':<52} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for name, r in measured.items():
+            print(
+                f"{name:<52} {r['throughput']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                f"{r['errors']:>7}"
+            )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}: nothing to compare, store one with --update-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.latency_threshold, args.throughput_threshold, args.min_ms)
+    if regressions:
+        print("Regressions against the baseline:")
+        print("\n".join(f"  {line}" for line in regressions))
+        sys.exit(1)
+    print("No regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Airflow DAG of the s8 pipeline, built from the stages of `bdi_api.s8.pipeline`.
+
+The local runner (`python -m bdi_api.s8.pipeline`) runs the same stage functions,
+so both write the same silver file for a day.
+"""
+
+from datetime import date, datetime
+
+from airflow.decorators import dag, task
+
+from bdi_api.s8 import pipeline, reference
+from bdi_api.s8.sources import LocalStore, RemoteHttp
+from bdi_api.settings import Settings
+
+settings = Settings()
+
+
+def _store() -> LocalStore:
+    # The API and the gold load read silver from BDI_LOCAL_DIR
+    return LocalStore(settings.local_dir)
+
+
+@dag(
+    schedule=None,
+    start_date=datetime(2023, 11, 1),
+    catchup=False,
+    params={"day": "2023-11-01", "files": 100},
+    tags=["s8"],
+)
+def s8_aircraft_pipeline() -> None:
+    @task
+    def list_files(params: dict) -> list[str]:
+        return pipeline.file_names(params["files"])
+
+    @task
+    def download_to_bronze(name: str, params: dict) -> str:
+        day = date.fromisoformat(params["day"])
+        raw = pipeline.download(day, name, http=RemoteHttp())
+        return pipeline.store_bronze(day, name, raw, store=_store())
+
+    @task
+    def bronze_to_silver(keys: list[str], params: dict) -> str:
+        day = date.fromisoformat(params["day"])
+        store = _store()
+        current = reference.current()
+        tables = [pipeline.enrich(current.versions, pipeline.parse(store.get(key)), reference=current) for key in keys]
+        pipeline.write_aircraft(day, *tables, store=store)
+        return pipeline.write_silver(day, *tables, store=store)
+
+    @task
+    def silver_to_gold(silver: str, params: dict) -> int:
+        return pipeline.load_gold(date.fromisoformat(params["day"]), silver)
+
+    bronze = download_to_bronze.expand(name=list_files())
+    silver_to_gold(bronze_to_silver(bronze))
+
+
+s8_aircraft_pipeline()
@@ -1,4 +1,62 @@
+import logging
+from collections.abc import Iterator
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import Engine, text
+
+from bdi_api import db
+from bdi_api.db import get_engine, reset_query_stats
+
+HR_SCHEMA = [
+    "CREATE TABLE department (id INTEGER PRIMARY KEY, name TEXT, location TEXT)",
+    "CREATE TABLE employee (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, email TEXT, "
+    "salary NUMERIC, hire_date DATE, department_id INTEGER REFERENCES department (id))",
+    "CREATE TABLE salary_history (id INTEGER PRIMARY KEY, employee_id INTEGER REFERENCES employee (id), "
+    "change_date DATE, old_salary NUMERIC, new_salary NUMERIC, reason TEXT)",
+]
+DEPARTMENTS = [(1, "Engineering"), (2, "Sales")]
+# (id, first_name, department_id, current salary, hire_date)
+EMPLOYEES = [(1, "Ada", 1, 120, "2020-01-01"), (2, "Bob", 1, 90, "2021-06-01"), (3, "Cy", 2, 70, "2023-03-01")]
+# (employee_id, change_date, old_salary, new_salary)
+SALARY_HISTORY = [(1, "2021-01-01", 100, 110), (1, "2022-01-01", 110, 120), (2, "2022-06-01", 80, 90)]
+
+
+@pytest.fixture
+def hr_database(tmp_path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    """A small HR database with salary history, used by the API instead of BDI_DB_URL."""
+    monkeypatch.setattr(db.settings, "db_url", f"sqlite:///{tmp_path / 'hr.db'}")
+    get_engine.cache_clear()
+    engine = get_engine()
+    with engine.begin() as conn:
+        for statement in HR_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO department (id, name, location) VALUES (:id, :name, 'Barcelona')"),
+            [{"id": id, "name": name} for id, name in DEPARTMENTS],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO employee (id, first_name, last_name, email, salary, hire_date, department_id) "
+                "VALUES (:id, :name, 'Test', :name || '@example.com', :salary, :hire_date, :department_id)"
+            ),
+            [
+                {"id": id, "name": name, "department_id": department_id, "salary": salary, "hire_date": hire_date}
+                for id, name, department_id, salary, hire_date in EMPLOYEES
+            ],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO salary_history (employee_id, change_date, old_salary, new_salary, reason) "
+                "VALUES (:employee_id, :change_date, :old_salary, :new_salary, 'Review')"
+            ),
+            [
+                {"employee_id": employee_id, "change_date": change_date, "old_salary": old, "new_salary": new}
+                for employee_id, change_date, old, new in SALARY_HISTORY
+            ],
+        )
+    yield engine
+    get_engine.cache_clear()
 
 
 class TestS5Student:
@@ -13,6 +71,88 @@ class TestS5Student:
             response = client.post("/api/s5/db/init")
             assert True
 
+    def test_salaries_as_of_requires_date(self, client: TestClient) -> None:
+        with client as client:
+            response = client.get("/api/s5/salaries/as-of")
+            assert response.status_code == 422
+
+    def test_query_stats(self, client: TestClient, hr_database: Engine) -> None:
+        route = "/api/s5/salaries/as-of"
+        with client as client:
+            response = client.get("/db/query-stats")
+            assert not response.is_error
+            assert isinstance(response.json(), dict)
+            client.get(route, params={"as_of": "2024-01-01"})
+            before = client.get("/db/query-stats").json()[route]
+            client.get(route, params={"as_of": "2021-07-01"})
+            after = client.get("/db/query-stats").json()[route]
+        assert (after["requests"], after["queries"]) == (before["requests"] + 1, before["queries"] + 1)
+        assert after["total_ms"] > before["total_ms"]
+
+    def test_slow_queries_are_logged_with_their_plan(
+        self, client: TestClient, hr_database: Engine, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        monkeypatch.setattr(db.settings, "slow_query_ms", 0)
+        monkeypatch.setattr(db.settings, "explain_slow_queries", True)
+        with client as client, caplog.at_level(logging.WARNING, logger="uvicorn.error"):
+            reset_query_stats()
+            client.get("/api/s5/salaries/as-of", params={"as_of": "2024-01-01"})
+            stats = client.get("/db/query-stats").json()["/api/s5/salaries/as-of"]
+        assert stats["slow_queries"] == stats["queries"] > 0
+        [slow] = [r.getMessage() for r in caplog.records if "Slow query" in r.getMessage() and "WITH" in r.getMessage()]
+        assert "on /api/s5/salaries/as-of:" in slow
+        # The plan comes after the statement, one line per step
+        assert "\n    " in slow and "ix_salary_history_employee_date" in slow.split("\n", 1)[1]
+
+    def test_failed_explain_keeps_the_transaction(self, hr_database: Engine) -> None:
+        with hr_database.begin() as conn:
+            conn.execute(text("INSERT INTO department (id, name) VALUES (10, 'Legal')"))
+            [error] = db._explain(conn, "SELECT * FROM no_such_table", ())
+            assert error.startswith("EXPLAIN failed")
+            conn.execute(text("INSERT INTO department (id, name) VALUES (11, 'Finance')"))
+        with hr_database.connect() as conn:
+            ids = conn.execute(text("SELECT id FROM department WHERE id >= 10 ORDER BY id")).scalars().all()
+        assert ids == [10, 11]
+
+    def test_payroll_as_of_rejects_bad_date(self, client: TestClient) -> None:
+        with client as client:
+            response = client.get("/api/s5/departments/payroll/as-of?as_of=yesterday")
+            assert response.status_code == 422
+
+    def test_salaries_as_of(self, client: TestClient, hr_database: Engine) -> None:
+        def salaries(as_of: str) -> dict[int, float]:
+            response = client.get("/api/s5/salaries/as-of", params={"as_of": as_of})
+            assert not response.is_error
+            return {row["employee_id"]: row["salary"] for row in response.json()}
+
+        with client as client:
+            # Before any change: the old salary of the first one
+            assert salaries("2020-06-01") == {1: 100}
+            # After a change, and before the first change of an employee hired since
+            assert salaries("2021-07-01") == {1: 110, 2: 80}
+            # On the day of a change, and the current salary for an employee without history
+            assert salaries("2024-01-01") == {1: 120, 2: 90, 3: 70}
+            response = client.get("/api/s5/departments/payroll/as-of", params={"as_of": "2024-01-01"})
+            assert [(r["department_name"], r["employee_count"], r["payroll"]) for r in response.json()] == [
+                ("Engineering", 2, 210),
+                ("Sales", 1, 70),
+            ]
+            first = client.get("/api/s5/salaries/as-of", params={"as_of": "2020-06-01"}).json()[0]
+            assert (first["first_name"], first["department_name"]) == ("Ada", "Engineering")
+
+    def test_as_of_is_one_query_per_request(self, client: TestClient, hr_database: Engine) -> None:
+        with client as client:
+            # The first request creates the salary_history index
+            client.get("/api/s5/salaries/as-of", params={"as_of": "2024-01-01"})
+            with hr_database.connect() as conn:
+                indexes = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+            assert "ix_salary_history_employee_date" in indexes
+            reset_query_stats()
+            for as_of in ["2020-06-01", "2021-07-01", "2024-01-01"]:
+                client.get("/api/s5/salaries/as-of", params={"as_of": as_of})
+            stats = client.get("/db/query-stats").json()["/api/s5/salaries/as-of"]
+        assert (stats["requests"], stats["queries"], stats["max_queries_per_request"]) == (3, 3, 1)
+
 
 class TestItCanBeEvaluated:
     """
@@ -1,5 +1,14 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+
+import pytest
 from fastapi.testclient import TestClient
 
+from bdi_api.s6 import buckets, jobs, mongo
+from bdi_api.streaming import MalformedBody, iter_json_documents
+
 
 class TestS6Student:
     """
@@ -26,6 +35,196 @@ class TestS6Student:
             )
             assert True
 
+    def test_bulk_ndjson_reports_errors_per_batch(self, client: TestClient) -> None:
+        position = {"icao": "bulk01", "type": "B738", "lat": 41.3, "lon": 2.1, "timestamp": "2026-02-19T10:30:00Z"}
+        body = "\n".join([json.dumps(position), json.dumps(position), json.dumps({"icao": "bulk01"})])
+        with client as client:
+            response = client.post(
+                "/api/s6/aircraft/bulk?batch_size=2",
+                content=body,
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            assert not response.is_error
+            r = response.json()
+            assert r["received"] == 3
+            assert r["inserted"] == 2
+            assert [len(b["errors"]) for b in r["batches"]] == [0, 1]
+            assert r["batches"][1]["errors"][0]["index"] == 2
+
+    @pytest.mark.parametrize("body", ['[{"icao": ', "[1 2]", "[1,,2]", "[1,2,]", "[,1]", "[1]x"])
+    def test_bulk_rejects_broken_array(self, client: TestClient, body: str) -> None:
+        with client as client:
+            response = client.post("/api/s6/aircraft/bulk", content=body)
+            assert response.status_code == 400
+
+    @pytest.mark.parametrize("body", ["[1 2]", "[1,,2]", "[1,2,]", "[1,\n]"])
+    def test_array_separators_are_checked_across_chunks(self, body: str) -> None:
+        async def one_byte_at_a_time() -> AsyncIterator[bytes]:
+            for byte in body.encode():
+                yield bytes([byte])
+
+        async def parse() -> list:
+            return [document async for _, document, _ in iter_json_documents(one_byte_at_a_time())]
+
+        with pytest.raises(MalformedBody):
+            asyncio.run(parse())
+
+    def test_array_is_parsed_across_chunks(self) -> None:
+        body = ' [ {"a": [1, 2]} ,\n12,"x" , null ]\n'
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for i in range(0, len(body), 3):
+                yield body[i : i + 3].encode()
+
+        async def parse() -> list:
+            return [document async for _, document, _ in iter_json_documents(chunks())]
+
+        assert asyncio.run(parse()) == [{"a": [1, 2]}, 12, "x", None]
+
+    def test_no_query_does_a_collscan(self, client: TestClient) -> None:
+        with client as client:
+            assert not client.post("/api/s6/diagnostics/indexes").is_error
+            response = client.get("/api/s6/diagnostics/indexes?icao=bulk01")
+            assert not response.is_error
+            r = response.json()
+            for collection in r["indexes"].values():
+                assert collection["missing"] == []
+            for name, query in r["queries"].items():
+                assert not query["collscan"], f"{name} does a COLLSCAN: {query['stages']}"
+
+    def test_indexes_are_created_at_startup(self, client: TestClient) -> None:
+        expected = {
+            "positions": {index.document["name"] for index in mongo.POSITION_INDEXES},
+            "position_buckets": {index.document["name"] for index in mongo.BUCKET_INDEXES},
+        }
+        with client as client:
+            for collection in (mongo.positions(), mongo.position_buckets()):
+                client.portal.call(collection.drop_indexes)
+        # The lifespan creates them again, in the background
+        with client as client:
+            for _ in range(100):
+                present = {
+                    collection.name: set(client.portal.call(collection.index_information))
+                    for collection in (mongo.positions(), mongo.position_buckets())
+                }
+                if all(expected[name] <= present[name] for name in expected):
+                    break
+                time.sleep(0.05)
+            for name in expected:
+                assert expected[name] <= present[name], f"{name} is missing {expected[name] - present[name]}"
+
+    def test_stats_follow_inserts_and_deletes(self, client: TestClient) -> None:
+        position = {"icao": "cnt001", "type": "ZZTEST", "lat": 41.3, "lon": 2.1, "timestamp": "2026-02-19T10:30:00Z"}
+        with client as client:
+            client.delete("/api/s6/aircraft/cnt001")
+            client.post("/api/s6/aircraft", json=position)
+            client.post("/api/s6/aircraft/bulk", content=json.dumps([position, position]))
+            stats = {s["type"]: s["count"] for s in client.get("/api/s6/aircraft/stats").json()}
+            assert stats["ZZTEST"] == 3
+            assert client.delete("/api/s6/aircraft/cnt001").json()["deleted"] == 3
+            stats = {s["type"]: s["count"] for s in client.get("/api/s6/aircraft/stats").json()}
+            assert "ZZTEST" not in stats
+            rebuilt = client.post("/api/s6/aircraft/stats/rebuild").json()
+            assert "ZZTEST" not in {s["type"] for s in rebuilt}
+
+    def test_list_aircraft_cursor_pagination(self, client: TestClient) -> None:
+        positions = [
+            {"icao": f"cur00{i}", "registration": f"EC-CU{i}", "lat": 41.3, "lon": 2.1, "timestamp": "2026-02-19T10:30"}
+            for i in range(3)
+        ]
+        with client as client:
+            client.post("/api/s6/aircraft/bulk", content=json.dumps(positions))
+            first = client.get("/api/s6/aircraft/?after=cur000&page_size=1")
+            assert [a["icao"] for a in first.json()] == ["cur001"]
+            assert first.headers["X-Next-After"] == "cur001"
+            second = client.get("/api/s6/aircraft/?after=cur001&page_size=1").json()
+            assert second == [{"icao": "cur002", "registration": "EC-CU2", "type": None}]
+            for position in positions:
+                client.delete(f"/api/s6/aircraft/{position['icao']}")
+
+    def test_bucket_storage_mode(self, client: TestClient, monkeypatch) -> None:
+        monkeypatch.setattr(mongo.settings, "s6_storage_mode", "buckets")
+        positions = [
+            {"icao": "bkt001", "type": "A320", "lat": 41.3, "lon": 2.1, "timestamp": f"2026-02-19T10:3{i}:00Z"}
+            for i in range(3)
+        ]
+        with client as client:
+            assert client.post("/api/s6/aircraft/bulk", content=json.dumps(positions)).json()["inserted"] == 3
+            latest = client.get("/api/s6/aircraft/bkt001").json()
+            assert latest["timestamp"] == "2026-02-19T10:32:00Z"
+            assert client.delete("/api/s6/aircraft/bkt001").json()["deleted"] == 3
+            assert client.get("/api/s6/aircraft/bkt001").status_code == 404
+
+    def test_bucket_batches_are_split(self) -> None:
+        documents = [{"icao": "cap001", "timestamp": f"2026-02-19T10:30:0{i}Z"} for i in range(5)]
+        operations, stored_by, errors = buckets.bucket_updates(documents, 3600, 2)
+        assert errors == {}
+        assert stored_by == [[0, 1], [2, 3], [4]]
+        # Only a bucket with room for the whole chunk matches
+        assert [operation._filter["count"] for operation in operations] == [{"$lte": 0}, {"$lte": 0}, {"$lte": 1}]
+
+    def test_buckets_never_exceed_max_positions(self, client: TestClient, monkeypatch) -> None:
+        monkeypatch.setattr(mongo.settings, "s6_storage_mode", "buckets")
+        monkeypatch.setattr(mongo.settings, "s6_bucket_max_positions", 2)
+        positions = [
+            {"icao": "cap002", "lat": 41.3, "lon": 2.1, "timestamp": f"2026-02-19T10:30:0{i}Z"} for i in range(5)
+        ]
+        with client as client:
+            client.delete("/api/s6/aircraft/cap002")
+            client.post("/api/s6/aircraft", json=positions[0])
+            client.post("/api/s6/aircraft/bulk", content=json.dumps(positions[1:]))
+            stored = client.portal.call(mongo.position_buckets().find({"icao": "cap002"}).to_list)
+            assert sorted(bucket["count"] for bucket in stored) == [1, 2, 2]
+            assert all(len(bucket["positions"]) == bucket["count"] for bucket in stored)
+            assert client.delete("/api/s6/aircraft/cap002").json()["deleted"] == 5
+
+    def test_storage_report(self, client: TestClient) -> None:
+        with client as client:
+            r = client.get("/api/s6/diagnostics/storage?sample=5").json()
+            for mode in ["documents", "buckets"]:
+                for field in ["documents", "positions", "index_size", "latest_position_ms"]:
+                    assert field in r[mode]
+
+    def test_background_deletion(self, client: TestClient) -> None:
+        positions = [
+            {"icao": "del001", "lat": 41.3, "lon": 2.1, "timestamp": f"2026-02-19T10:{i:02d}:00Z"} for i in range(5)
+        ]
+        with client as client:
+            client.post("/api/s6/aircraft/bulk", content=json.dumps(positions))
+            response = client.delete("/api/s6/aircraft/del001?mode=background")
+            assert response.status_code == 202
+            job_id = response.json()["id"]
+            for _ in range(100):
+                job = client.get(f"/api/s6/aircraft/deletions/{job_id}").json()
+                if job["status"] != "running":
+                    break
+                time.sleep(0.05)
+            assert job["status"] == "done"
+            assert job["deleted"] == 5
+            assert client.get("/api/s6/aircraft/del001").status_code == 404
+
+    def test_background_deletion_reuses_running_job(self, client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(jobs.settings, "s6_delete_batch_size", 2)
+        monkeypatch.setattr(jobs.settings, "s6_delete_throttle_ms", 200)
+        positions = [
+            {"icao": "del002", "type": "ZZDEL", "lat": 41.3, "lon": 2.1, "timestamp": f"2026-02-19T11:{i:02d}:00Z"}
+            for i in range(5)
+        ]
+        with client as client:
+            client.post("/api/s6/aircraft/bulk", content=json.dumps(positions))
+            stats = {s["type"]: s["count"] for s in client.get("/api/s6/aircraft/stats").json()}
+            assert stats["ZZDEL"] == 5
+            job_id = client.delete("/api/s6/aircraft/del002?mode=background").json()["id"]
+            assert client.delete("/api/s6/aircraft/del002?mode=background").json()["id"] == job_id
+            for _ in range(100):
+                job = client.get(f"/api/s6/aircraft/deletions/{job_id}").json()
+                if job["status"] != "running":
+                    break
+                time.sleep(0.05)
+            assert (job["status"], job["deleted"], job["batches"]) == ("done", 5, 3)
+            stats = {s["type"]: s["count"] for s in client.get("/api/s6/aircraft/stats").json()}
+            assert "ZZDEL" not in stats
+
 
 class TestItCanBeEvaluated:
     """
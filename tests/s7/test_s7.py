@@ -1,5 +1,13 @@
+import json
+import time
+from functools import lru_cache
+
+import pytest
 from fastapi.testclient import TestClient
 
+from bdi_api.s7 import backends, exercise, graph
+from bdi_api.s7.cache import RecommendationCache
+
 
 class TestS7Student:
     """
@@ -21,6 +29,110 @@ class TestS7Student:
             )
             assert True
 
+    def test_bulk_import(self, client: TestClient) -> None:
+        persons = [{"name": f"BulkUser{i}", "city": "Girona", "age": 20 + i} for i in range(5)]
+        persons.append({"name": "BulkUserBroken", "city": "Girona"})
+        relationships = [
+            {"from_person": "BulkUser0", "to_person": "BulkUser1"},
+            {"from_person": "BulkUser1", "to_person": "BulkUser2"},
+            {"from_person": "BulkUser0", "to_person": "NobodyAtAll"},
+        ]
+        with client as client:
+            response = client.post(
+                "/api/s7/graph/persons/bulk?batch_size=4",
+                content="\n".join(json.dumps(person) for person in persons),
+            )
+            assert response.status_code == 200
+            r = response.json()
+            assert (r["received"], r["written"], len(r["batches"])) == (6, 5, 2)
+            assert r["batches"][1]["errors"][0]["index"] == 5
+
+            response = client.post("/api/s7/graph/relationships/bulk", json=relationships)
+            assert response.status_code == 200
+            r = response.json()
+            assert r["written"] == 2
+            assert [error["index"] for error in r["batches"][0]["errors"]] == [2]
+
+            friends = client.get("/api/s7/graph/person/BulkUser1/friends").json()
+            assert {friend["name"] for friend in friends} == {"BulkUser0", "BulkUser2"}
+
+    def test_memory_backend(self, client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(backends.settings, "s7_graph_backend", "memory")
+        monkeypatch.setattr(backends, "_backend", lru_cache(backends._backend.__wrapped__))
+        persons = [{"name": name, "city": "Reus", "age": 30} for name in ["Ann", "Ben", "Cat", "Dan", "Eve"]]
+        relationships = [
+            {"from_person": "Ann", "to_person": "Ben"},
+            {"from_person": "Cat", "to_person": "Ann"},
+            {"from_person": "Ben", "to_person": "Dan"},
+            {"from_person": "Cat", "to_person": "Dan"},
+            {"from_person": "Cat", "to_person": "Eve"},
+        ]
+        with client as client:
+            client.post("/api/s7/graph/persons/bulk", json=persons)
+            client.post("/api/s7/graph/relationships/bulk", json=relationships)
+            names = [person["name"] for person in client.get("/api/s7/graph/persons").json()]
+            assert names == ["Ann", "Ben", "Cat", "Dan", "Eve"]
+            assert [f["name"] for f in client.get("/api/s7/graph/person/Ann/friends").json()] == ["Ben", "Cat"]
+            recommendations = client.get("/api/s7/graph/person/Ann/recommendations").json()
+            assert [(r["name"], r["mutual_friends"]) for r in recommendations] == [("Dan", 2), ("Eve", 1)]
+            assert client.get("/api/s7/graph/person/Nobody/recommendations").status_code == 404
+
+    def test_recommendation_cache(self, client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(backends.settings, "s7_graph_backend", "memory")
+        monkeypatch.setattr(backends, "_backend", lru_cache(backends._backend.__wrapped__))
+        monkeypatch.setattr(exercise, "recommendation_cache", RecommendationCache(max_size=2))
+        persons = [{"name": name, "city": "Lleida", "age": 40} for name in ["Ada", "Bo", "Cy", "Di", "Ed"]]
+        relationships = [
+            {"from_person": "Ada", "to_person": "Bo"},
+            {"from_person": "Bo", "to_person": "Cy"},
+            {"from_person": "Di", "to_person": "Ed"},
+        ]
+        with client as client:
+            client.post("/api/s7/graph/persons/bulk", json=persons)
+            client.post("/api/s7/graph/relationships/bulk", json=relationships)
+            for name in ["Ada", "Ada", "Di"]:
+                client.get(f"/api/s7/graph/person/{name}/recommendations")
+            stats = client.get("/api/s7/graph/cache/stats").json()
+            assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 2)
+
+            # Cy-Di only affects Cy, Di and their friends (Bo, Ed): Ada stays cached
+            client.post("/api/s7/graph/relationship", json={"from_person": "Cy", "to_person": "Di"})
+            assert client.get("/api/s7/graph/cache/stats").json()["size"] == 1
+            client.get("/api/s7/graph/person/Ada/recommendations")
+            recommendations = client.get("/api/s7/graph/person/Di/recommendations").json()
+            assert [r["name"] for r in recommendations] == ["Bo"]
+            stats = client.get("/api/s7/graph/cache/stats").json()
+            assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 3, 0.4)
+
+    def test_list_persons_cursor_pagination(self, client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(backends.settings, "s7_graph_backend", "memory")
+        monkeypatch.setattr(backends, "_backend", lru_cache(backends._backend.__wrapped__))
+        persons = [{"name": f"Page{i:02d}", "city": "Vic", "age": 50} for i in range(25)]
+        with client as client:
+            client.post("/api/s7/graph/persons/bulk", json=persons)
+            names, after = [], None
+            while True:
+                params = {"limit": 10, **({"after": after} if after else {})}
+                response = client.get("/api/s7/graph/persons", params=params)
+                names += [person["name"] for person in response.json()]
+                after = response.headers.get("X-Next-After")
+                if after is None:
+                    break
+            assert names == [person["name"] for person in persons]
+
+    def test_neo4j_unavailable_is_503(self, client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(graph.settings, "neo4j_url", "bolt://127.0.0.1:1")
+        monkeypatch.setattr(graph.settings, "neo4j_connection_timeout", 0.5)
+        monkeypatch.setattr(graph.settings, "neo4j_max_transaction_retry_time", 0)
+        monkeypatch.setattr(backends.settings, "s7_graph_backend", "neo4j")
+        monkeypatch.setattr(backends, "_backend", lru_cache(backends._backend.__wrapped__))
+        with client as client:
+            start = time.monotonic()
+            response = client.get("/api/s7/graph/persons")
+            assert response.status_code == 503
+            assert "Neo4J is unavailable" in response.json()["detail"]
+            assert time.monotonic() - start < 10
+
 
 class TestItCanBeEvaluated:
     """
@@ -1,5 +1,20 @@
+import gzip
+import json
+import os
+import shutil
+from datetime import date
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
 from fastapi.testclient import TestClient
 
+from bdi_api import db
+from bdi_api.s8 import gold, pipeline, reference, silver
+from bdi_api.s8.runner import Runner
+from bdi_api.s8.sources import LocalHttp, LocalStore
+
 
 class TestS8Student:
     """
@@ -14,6 +29,145 @@ class TestS8Student:
             response = client.get("/api/s8/aircraft/")
             assert True
 
+    @pytest.fixture
+    def silver_day(self, tmp_path, monkeypatch: pytest.MonkeyPatch) -> date:
+        monkeypatch.setattr(silver.settings, "local_dir", str(tmp_path))
+        monkeypatch.setattr(reference.settings, "local_dir", str(tmp_path))
+        monkeypatch.setattr(gold, "get_engine", lambda: db.get_engine(f"sqlite:///{tmp_path / 'gold.db'}"))
+        day_dir = tmp_path / "silver" / "tracking" / "day=2023-11-01"
+        os.makedirs(day_dir)
+        rows = "('a00001', 'A320'), ('a00001', 'A320'), ('b00002', 'XXXX'), ('c00003', 'A320')"
+        duckdb.sql(f"COPY (SELECT * FROM (VALUES {rows}) t(icao, type)) TO '{day_dir / 'part-0.parquet'}'")
+        (tmp_path / "aircraft_type_fuel_consumption_rates.json").write_text(json.dumps({"A320": {"galph": 800}}))
+        return date(2023, 11, 1)
+
+    def test_fleet_co2_is_streamed(self, client: TestClient, silver_day: date) -> None:
+        with client as client:
+            response = client.get("/api/s8/aircraft/co2?day=2023-11-01")
+            assert response.headers["content-type"] == "application/x-ndjson"
+            results = [json.loads(line) for line in response.text.splitlines()]
+            assert [r["icao"] for r in results] == ["a00001", "b00002", "c00003"]
+            assert results[0]["hours_flown"] == pytest.approx(10 / 3600)
+            assert results[0]["co2"] == pytest.approx(10 / 3600 * 800 * 3.04 * 3.15 / 907.185)
+            assert results[1]["co2"] is None
+
+            response = client.get("/api/s8/aircraft/co2?day=2023-11-01&icao=c00003&icao=zzzzzz")
+            assert [json.loads(line)["icao"] for line in response.text.splitlines()] == ["c00003"]
+            single = client.get("/api/s8/aircraft/a00001/co2?day=2023-11-01").json()
+            assert single == results[0]
+
+    def test_co2_reads_the_gold_layer(self, client: TestClient, silver_day: date) -> None:
+        with client as client:
+            from_silver = [
+                client.get(f"/api/s8/aircraft/{icao}/co2?day=2023-11-01").json() for icao in ("a00001", "b00002")
+            ]
+            assert gold.build_day(silver_day) == 3
+            # Once materialized, the answer no longer depends on the silver files
+            shutil.rmtree(silver.silver_dir())
+            for expected in from_silver:
+                assert client.get(f"/api/s8/aircraft/{expected['icao']}/co2?day=2023-11-01").json() == expected
+            absent = client.get("/api/s8/aircraft/zzzzzz/co2?day=2023-11-01").json()
+            assert (absent["hours_flown"], absent["co2"]) == (0.0, None)
+
+    def test_reference_data_is_swapped_when_files_change(self, silver_day: date, tmp_path) -> None:
+        database = tmp_path / "aircraft_database.csv"
+        database.write_text(
+            "icao,registration,type,owner,manufacturer,model\n"
+            "C00003,EC-CCC,B738,Carol Air,Boeing,737-800\n"
+            "a00001,EC-AAA,A320,Alice Air,Airbus,A320-214\n"
+        )
+        first = reference.current()
+        assert reference.current() is first
+        assert first.fuel_rates == {"A320": 800}
+        assert first.aircraft_info("c00003")["owner"] == "Carol Air"
+        assert first.aircraft_info("b00002") is None
+
+        batch = pa.table({"icao": ["a00001", "b00002", "c00003"], "registration": [None, "EC-BBB", "EC-XXX"]})
+        enriched = first.enrich(batch).to_pylist()
+        assert [row["registration"] for row in enriched] == ["EC-AAA", "EC-BBB", "EC-XXX"]
+        assert [row["owner"] for row in enriched] == ["Alice Air", None, "Carol Air"]
+
+        database.write_text("icao,registration,type,owner,manufacturer,model\nb00002,EC-BBB,A320,Bob Air,Airbus,A320\n")
+        os.utime(database, ns=(0, 1))
+        second = reference.current()
+        assert second is not first
+        assert second.aircraft_info("b00002")["owner"] == "Bob Air"
+        assert first.aircraft_info("a00001")["owner"] == "Alice Air"
+
+    def test_local_pipeline_caches_and_matches_the_dag(self, client: TestClient, silver_day: date, tmp_path) -> None:
+        os.remove(tmp_path / "silver" / "tracking" / "day=2023-11-01" / "part-0.parquet")
+        mirror = tmp_path / "mirror"
+        os.makedirs(mirror / "2023" / "11" / "01")
+        for i, name in enumerate(pipeline.file_names(3)):
+            aircraft = [{"hex": "A00001", "t": "A320", "alt_baro": "ground"}, {"hex": "b00002", "t": "B738", "seen": 1}]
+            data = json.dumps({"now": 1698796800 + 5 * i, "aircraft": aircraft}).encode()
+            (mirror / "2023" / "11" / "01" / name).write_bytes(gzip.compress(data))
+        http = LocalHttp(str(mirror), pipeline.settings.source_url)
+        store = LocalStore(str(tmp_path))
+        runner = Runner(str(tmp_path / "cache"), io_workers=2, cpu_workers=2)
+
+        runner.run(pipeline.build_tasks(silver_day, 3, http, store))
+        assert not any(run.cached for run in runner.runs)
+        silver_file = store.get(pipeline.silver_key(silver_day))
+        os.remove(tmp_path / pipeline.silver_key(silver_day))
+        runner.run(pipeline.build_tasks(silver_day, 3, http, store))
+        # Only the writers run again, and the deleted silver file is back
+        sinks = {f"bronze/{name}" for name in pipeline.file_names(3)} | {"silver", "aircraft", "gold"}
+        assert {run.name for run in runner.runs if not run.cached} == sinks
+        assert store.get(pipeline.silver_key(silver_day)) == silver_file
+
+        runner.max_entries = 4
+        runner.run(pipeline.build_tasks(silver_day, 3, http, store))
+        assert len(os.listdir(tmp_path / "cache")) == 4
+        runner.run(pipeline.build_tasks(silver_day, 3, http, store))
+        assert sum(run.cached for run in runner.runs) == 4
+
+        # What the DAG tasks do, one after the other
+        current = reference.current()
+        tables = [
+            pipeline.enrich(
+                current.versions, pipeline.parse(store.get(pipeline.bronze_key(silver_day, name))), reference=current
+            )
+            for name in pipeline.file_names(3)
+        ]
+        pipeline.write_silver(silver_day, *tables, store=store)
+        assert store.get(pipeline.silver_key(silver_day)) == silver_file
+        with client as client:
+            assert client.get("/api/s8/aircraft/b00002/co2?day=2023-11-01").json()["hours_flown"] == 15 / 3600
+
+    def test_aircraft_pages_read_only_their_row_groups(
+        self, client: TestClient, silver_day: date, tmp_path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(pipeline.settings, "s8_row_group_size", 2)
+        read = []
+        read_row_groups = pq.ParquetFile.read_row_groups
+        monkeypatch.setattr(
+            pq.ParquetFile,
+            "read_row_groups",
+            lambda self, groups, **kw: read.append(list(groups)) or read_row_groups(self, groups, **kw),
+        )
+        store = LocalStore(str(tmp_path))
+        icaos = [f"a0000{i}" for i in (4, 1, 3, 0, 2)]
+        observations = pa.Table.from_pylist(
+            [{"icao": icao, "timestamp": float(i)} for i, icao in enumerate(icaos)], schema=pipeline.SILVER_SCHEMA
+        )
+        pipeline.write_aircraft(silver_day, reference.current().enrich(observations), store=store)
+        with client as client:
+            pages = [client.get(f"/api/s8/aircraft/?num_results=2&page={page}").json() for page in range(4)]
+            assert [[a["icao"] for a in page] for page in pages] == [
+                ["a00000", "a00001"],
+                ["a00002", "a00003"],
+                ["a00004"],
+                [],
+            ]
+            assert read == [[0], [1], [2]]
+            client.get("/api/s8/aircraft/?num_results=2&page=0")
+            assert [a["icao"] for a in client.get("/api/s8/aircraft/?num_results=3&page=1").json()] == [
+                "a00003",
+                "a00004",
+            ]
+            assert read[-1] == [1, 2]
+
 
 class TestItCanBeEvaluated:
     """
@@ -1,5 +1,13 @@
+import asyncio
+import json
+
+import pytest
 from fastapi.testclient import TestClient
 
+from bdi_api.s9 import events, logs
+from bdi_api.s9.store import PipelineStore
+from bdi_api.s9.synthetic import generate_runs
+
 
 class TestS9Student:
     """
@@ -12,6 +20,113 @@ class TestS9Student:
             response = client.get("/api/s9/pipelines")
             assert True
 
+    def test_store_pages_match_filter_and_sort(self) -> None:
+        runs = list(generate_runs(2000, seed=1))
+        store = PipelineStore()
+        store.add_many(runs[:1500])
+        for run, stages in runs[1500:]:
+            store.add(run, stages)
+        for repository, status in [
+            (None, None),
+            ("bdi/service-03", None),
+            (None, "failure"),
+            ("bdi/service-03", "running"),
+        ]:
+            expected = [
+                run.id
+                for run, _ in sorted(runs, key=lambda item: item[0].started_at, reverse=True)
+                if repository in (None, run.repository) and status in (None, run.status)
+            ]
+            pages = [store.page(repository, status, offset, 7) for offset in range(0, len(expected) + 7, 7)]
+            assert [run.id for page in pages for run in page] == expected
+        assert store.stages("run-0000042") is runs[42][1]
+        assert store.stages("run-9999999") is None
+
+    def test_stage_logs_range_and_tail(self, client: TestClient, tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(logs.settings, "local_dir", str(tmp_path))
+        monkeypatch.setattr(logs, "CHUNK_SIZE", 16)
+        content = "".join(f"step {i}: ok\n" for i in range(100)).encode()
+        with client as client:
+            run = client.get("/api/s9/pipelines?num_results=1").json()[0]
+            url = client.get(f"/api/s9/pipelines/{run['id']}/stages").json()[0]["logs_url"]
+            assert client.get(url).status_code == 404
+            path = tmp_path / "s9_logs" / run["id"] / f"{run['stages'][0]}.log"
+            path.parent.mkdir(parents=True)
+            path.write_bytes(content)
+
+            response = client.get(url)
+            assert (response.status_code, response.content) == (200, content)
+            response = client.get(url, headers={"Range": "bytes=10-29"})
+            assert response.status_code == 206
+            assert response.headers["content-range"] == f"bytes 10-29/{len(content)}"
+            assert response.content == content[10:30]
+            assert client.get(url, headers={"Range": "bytes=-5"}).content == content[-5:]
+            assert client.get(url, headers={"Range": f"bytes={len(content)}-"}).status_code == 416
+            response = client.get(url, headers={"Range": "bytes=30-10"})
+            assert (response.status_code, response.content) == (200, content)
+            assert client.get(url, params={"tail": 3}).text == "step 97: ok\nstep 98: ok\nstep 99: ok\n"
+            assert client.get(url.replace("/logs", "x/logs")).status_code == 404
+
+    def test_tail_offset_matches_splitlines(self, tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+        path = tmp_path / "stage.log"
+        for content in [
+            b"",
+            b"\n\n\n",
+            b"a\nbb\n\nccc\n",
+            b"a\nbb\n\nccc",
+            b"".join(b"x" * i + b"\n" for i in range(40)),
+        ]:
+            path.write_bytes(content)
+            lines = content.splitlines(keepends=True)
+            for chunk_size in (1, 3, 16, 1024):
+                monkeypatch.setattr(logs, "CHUNK_SIZE", chunk_size)
+                for n in range(len(lines) + 2):
+                    tail = b"".join(lines[max(len(lines) - n, 0) :]) if n else b""
+                    assert logs.tail_offset(str(path), n) == len(content) - len(tail), (content, chunk_size, n)
+
+    def test_status_changes_stream_as_events(self, client: TestClient) -> None:
+        class Request:
+            """Stands for a client that disconnects after reading what is already in the feed."""
+
+            async def is_disconnected(self) -> bool:
+                self.checks = getattr(self, "checks", 0) + 1
+                return self.checks > 1
+
+        async def read(last_event_id, repository=None, status=None) -> list[str]:
+            return [chunk async for chunk in events.stream(Request(), last_event_id, repository, status)]
+
+        with client as client:
+            run = client.get("/api/s9/pipelines?num_results=1").json()[0]
+            start = events.feed.last_id
+            response = client.patch(f"/api/s9/pipelines/{run['id']}", json={"status": "failure"})
+            assert response.json()["status"] == "failure"
+            stage = run["stages"][0]
+            response = client.patch(f"/api/s9/pipelines/{run['id']}/stages/{stage}", json={"status": "skipped"})
+            assert response.json()["status"] == "skipped"
+            assert client.patch("/api/s9/pipelines/run-x", json={"status": "failure"}).status_code == 404
+            assert client.patch(f"/api/s9/pipelines/{run['id']}", json={"status": "done"}).status_code == 422
+            assert run["id"] in [r["id"] for r in client.get("/api/s9/pipelines?status_filter=failure").json()]
+
+        chunks = asyncio.run(read(start))
+        assert chunks[0].startswith("retry:")
+        assert [chunk.split("\n")[:2] for chunk in chunks[1:]] == [
+            [f"id: {start + 1}", "event: run"],
+            [f"id: {start + 2}", "event: stage"],
+        ]
+        data = json.loads(chunks[2].split("data: ")[1])
+        assert (data["run"]["id"], data["stage"]["name"], data["stage"]["status"]) == (run["id"], stage, "skipped")
+        assert len(asyncio.run(read(start + 1))) == 2
+        assert len(asyncio.run(read(start, repository=run["repository"], status="success"))) == 1
+
+        feed = events.ChangeFeed(2)
+        for i in range(3):
+            feed.publish("run", "r", "running", {"i": i})
+        assert feed.since(0) is None
+        assert [event.data["i"] for event in feed.since(1)] == [1, 2]
+        assert feed.since(3) == []
+        assert feed.since(500) is None
+        assert events.ChangeFeed(10).since(500) is None
+
 
 class TestItCanBeEvaluated:
     """
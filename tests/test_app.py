@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from bdi_api import metrics, profiling
+from bdi_api.metrics import registry
+from bdi_api.recorder import RequestRecorder
+from benchmarks import replay
+
+
+class TestRecorder:
+    def test_recorded_requests_can_be_replayed(self, tmp_path) -> None:
+        app = FastAPI()
+        received = []
+
+        @app.post("/items/{item_id}")
+        async def create(item_id: int, request: Request) -> dict:
+            received.append(await request.body())
+            return {"id": item_id}
+
+        @app.get("/fail")
+        def fail() -> None:
+            raise ValueError("boom")
+
+        path = tmp_path / "requests.jsonl"
+        app.add_middleware(RequestRecorder, path=str(path), max_body_bytes=8)
+        with TestClient(app, raise_server_exceptions=False) as client:
+            client.post("/items/1?verbose=1", content=b'{"a": 1}', headers={"content-type": "application/json"})
+            client.post("/items/2", content=b"\xff" * 20)
+            client.get("/fail")
+
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        first, second, failed = records
+        assert (first["method"], first["path"], first["route"], first["query"]) == (
+            "POST",
+            "/items/1",
+            "/items/{item_id}",
+            "verbose=1",
+        )
+        assert (first["status"], first["body"], first["content_type"]) == (200, '{"a": 1}', "application/json")
+        assert first["response_bytes"] == len(b'{"id":1}')
+        assert second["body_truncated"] and "body_base64" in second
+        assert failed["status"] == 500
+
+        recorded = replay.load(str(path))
+
+        async def replay_all(mode: str) -> dict:
+            received.clear()
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+                if mode == "closed":
+                    results = await replay.closed_loop(client, recorded, concurrency=2)
+                else:
+                    results = await replay.open_loop(client, recorded, speedup=100)
+            return results.report(1.0)
+
+        for mode in ("closed", "open"):
+            report = asyncio.run(replay_all(mode))
+            assert sorted(received) == [b'{"a": 1}', b"\xff" * 8]
+            assert report["total"]["requests"] == 3
+            assert report["routes"]["GET /fail"]["error_rate"] == 1.0
+            assert report["routes"]["POST /items/{item_id}"]["errors"] == 0
+            assert sum(report["histogram_ms"].values()) == 3
+
+    def test_empty_recording_reports_no_requests(self, tmp_path, capsys: pytest.CaptureFixture) -> None:
+        path = tmp_path / "requests.jsonl"
+        path.write_text("")
+
+        async def replay_empty() -> dict:
+            async with httpx.AsyncClient(base_url="http://replay") as client:
+                return (await replay.open_loop(client, replay.load(str(path)))).report(0.0)
+
+        report = asyncio.run(replay_empty())
+        assert report["total"] == {
+            "requests": 0,
+            "errors": 0,
+            "throughput": 0.0,
+            "p50_ms": 0.0,
+            "p95_ms": 0.0,
+            "p99_ms": 0.0,
+            "error_rate": 0.0,
+        }
+        replay.print_report(report)
+        assert capsys.readouterr().out.startswith("no requests")
+
+
+class TestMetrics:
+    def test_metrics_are_exposed_per_route(self, client: TestClient) -> None:
+        registry.reset()
+        with client as client:
+            client.get("/api/s9/pipelines?num_results=3")
+            client.get("/api/s9/pipelines?num_results=5")
+            client.get("/api/s9/pipelines/unknown/stages")
+            client.get("/no/such/path")
+            with metrics.timed("duckdb", "query"):
+                pass
+            with pytest.raises(ValueError), metrics.timed("s3", "GetObject"):
+                raise ValueError("boom")
+            response = client.get("/metrics")
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        lines = response.text.splitlines()
+        route = 'method="GET",route="/api/s9/pipelines"'
+        assert f'bdi_http_requests_total{{{route},status="200"}} 2' in lines
+        assert (
+            'bdi_http_requests_total{method="GET",route="/api/s9/pipelines/{pipeline_id}/stages",status="404"} 1'
+            in lines
+        )
+        assert 'bdi_http_requests_total{method="GET",route="unmatched",status="404"} 1' in lines
+        assert f'bdi_http_request_duration_seconds_bucket{{{route},le="+Inf"}} 2' in lines
+        assert f"bdi_http_request_duration_seconds_count{{{route}}} 2" in lines
+        assert f'bdi_http_response_size_bytes_bucket{{{route},le="100"}} 0' in lines
+        # The /metrics request itself is still being served
+        assert 'bdi_http_requests_in_flight{method="GET"} 1' in lines
+        assert 'bdi_storage_operation_duration_seconds_count{system="duckdb",operation="query"} 1' in lines
+        assert 'bdi_storage_errors_total{system="s3",operation="GetObject"} 1' in lines
+
+
+def spin(seconds: float) -> int:
+    end, count = time.perf_counter() + seconds, 0
+    while time.perf_counter() < end:
+        count += 1
+    return count
+
+
+class TestProfiling:
+    def test_opt_in_request_profile(self, tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(profiling.settings, "local_dir", str(tmp_path))
+        app = FastAPI()
+
+        @app.get("/slow")
+        def slow() -> dict:
+            return {"count": spin(0.1)}
+
+        app.add_middleware(profiling.ProfilingMiddleware, interval_ms=1)
+        app.include_router(profiling.router)
+        with TestClient(app) as client:
+            assert "x-profile-id" not in client.get("/slow").headers
+            response = client.get("/slow", headers={"X-Profile": "1"})
+            assert response.json()["count"] > 0
+            profile_id = response.headers["x-profile-id"]
+            assert response.headers["link"] == f'</profiles/{profile_id}>; rel="profile"'
+            assert "x-profile-id" in client.get("/slow?profile=1").headers
+
+            summary = client.get(f"/profiles/{profile_id}").text
+            assert summary.startswith("GET /slow\n")
+            hottest = summary.splitlines()[4]
+            assert "spin (tests/test_app.py" in hottest
+            stacks = client.get(f"/profiles/{profile_id}", params={"format": "folded"}).text.splitlines()
+            # Rooted at the endpoint, wherever the threadpool ran it
+            assert stacks and all(line.startswith("slow (tests/test_app.py") for line in stacks)
+            assert client.get("/profiles/0123456789abcdef0123456789abcdef").status_code == 404
+            assert client.get("/profiles/..%2Fsecret").status_code in (404, 422)
+        assert sorted(os.listdir(tmp_path / "profiles"))[0].endswith((".folded", ".txt"))